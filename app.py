@@ -4,27 +4,25 @@ import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 import numpy as np
 import time
-from collections import deque
 from datetime import datetime
-import socket
-import json
+from collector import SnapshotSubscriber
+from control_plane import HISTORY_METRICS, HISTORY_SIZE
+from scoring import compute_scores
+from selection import epsilon_greedy, power_of_two, argmin
+from history import HistoryRing
+from timeseries import SeriesStore, lttb
+from report import SessionAggregates
+from telemetry import TelemetryWriter
 
 # Import from client.py
 try:
-    from client import SERVERS, HOST, compute_score
+    from client import SERVERS, HOST
 except ImportError:
     SERVERS = [8001, 8002, 8003]
     HOST = '127.0.0.1'
-    def compute_score(pred_rtt, pred_load, pred_health, error_rate, pred_bandwidth,
-                      alpha=1.0, beta=0.5, gamma=0.3, delta=0.2, epsilon=0.4):
-        if pred_rtt is None: return float('inf')
-        health_penalty = (100 - pred_health) / 100.0 if pred_health is not None else 1.0
-        bandwidth_factor = 0
-        if pred_bandwidth is not None and pred_bandwidth > 0:
-            bandwidth_factor = (1000 - pred_bandwidth) / 1000.0
-        score = (alpha * pred_rtt + beta * (pred_load / 100.0) + gamma * health_penalty + 
-                delta * error_rate + epsilon * bandwidth_factor)
-        return score
+
+SERVER_INDEX = {p: i for i, p in enumerate(SERVERS)}
+TELEMETRY_PATH = "dashboard_telemetry.bin"
 
 st.set_page_config(
     page_title="Nexus Load Balancer Pro",
@@ -736,20 +734,24 @@ with col3:
 st.markdown("<div style='height: 30px;'></div>", unsafe_allow_html=True)
 
 # ==================== SESSION STATE ====================
-if 'monitoring_data' not in st.session_state:
-    st.session_state.monitoring_data = {
-        'plot_time': [],
-        'plot_data': {p: {'rtt': [], 'load': [], 'health': [], 'errors': [], 'bandwidth': [], 'chosen': []} for p in SERVERS},
-        'rtt_history': {p: deque(maxlen=10) for p in SERVERS},
-        'load_history': {p: deque(maxlen=10) for p in SERVERS},
-        'health_history': {p: deque(maxlen=10) for p in SERVERS},
-        'error_history': {p: deque(maxlen=10) for p in SERVERS},
-        'bandwidth_history': {p: deque(maxlen=10) for p in SERVERS},
+PLOT_METRICS = ('rtt', 'load', 'health', 'errors', 'bandwidth', 'chosen')
+
+def new_monitoring_data(session_start=None):
+    return {
+        'plot_store': SeriesStore([(p, m) for p in SERVERS for m in PLOT_METRICS]),
+        'history': HistoryRing(SERVERS, HISTORY_METRICS, HISTORY_SIZE),
+        'session': SessionAggregates(SERVERS, HISTORY_METRICS),  # whole-session totals + RTT sketch
+        'exports': {},  # name -> (inputs, rendered html), see memoized_export()
         'selection_count': {p: 0 for p in SERVERS},
-        'session_start': None,
+        'table_version': 0,  # last collector snapshot consumed
+        'tails': {},  # port -> (p50, p95, p99) RTT from the collector's per-edge sketches
+        'session_start': session_start,
         'session_end': None
     }
 
+if 'monitoring_data' not in st.session_state:
+    st.session_state.monitoring_data = new_monitoring_data()
+
 if 'monitoring_active' not in st.session_state:
     st.session_state.monitoring_active = False
 if 'current_round' not in st.session_state:
@@ -781,9 +783,14 @@ with st.sidebar:
         beta = st.number_input("Load Weight (β)", 0.0, 10.0, 0.5, 0.1)
         gamma = st.number_input("Health Weight (γ)", 0.0, 10.0, 0.3, 0.1)
         delta = st.number_input("Error Weight (δ)", 0.0, 10.0, 0.2, 0.1)
+        zeta = st.number_input("Cache Miss Weight (ζ)", 0.0, 10.0, 0.3, 0.1)
+        eta = st.number_input("Tail Latency Weight (η)", 0.0, 10.0, 0.5, 0.1,
+                              help="Weight of p95 RTT above the mean RTT")
     
     st.markdown("---")
     st.markdown("### 🎲 Selection Strategy")
+    strategy = st.selectbox("Strategy", ("ε-greedy", "Power of two choices", "Argmin"),
+                            help="How the next server is picked from the scores")
     eps = st.slider("Exploration (ε)", 0.0, 0.6, 0.20, 0.05, help="ε-greedy exploration rate")
     stickiness_penalty = st.slider("Anti-stickiness", 0.0, 0.2, 0.03, 0.01)
     
@@ -811,6 +818,7 @@ with st.sidebar:
 def create_professional_metrics():
     """Create stunning metric cards"""
     data = st.session_state.monitoring_data
+    history = data['history']
     
     st.markdown("### 📊 Live Server Metrics")
     st.markdown("<div style='height: 16px;'></div>", unsafe_allow_html=True)
@@ -819,7 +827,7 @@ def create_professional_metrics():
     
     for idx, port in enumerate(SERVERS):
         with cols[idx]:
-            is_online = len(data['rtt_history'][port]) > 0
+            is_online = history.count(port) > 0
             status_badge = "badge-online" if is_online else "badge-waiting"
             status_text = "ONLINE" if is_online else "WAITING"
             
@@ -836,21 +844,22 @@ def create_professional_metrics():
             st.markdown("<div style='height: 12px;'></div>", unsafe_allow_html=True)
             
             if is_online:
-                latest_rtt = data['rtt_history'][port][-1]
-                latest_load = data['load_history'][port][-1]
-                latest_health = data['health_history'][port][-1]
-                latest_errors = data['error_history'][port][-1] * 100
-                latest_bandwidth = data['bandwidth_history'][port][-1]
+                latest_rtt = history.latest(port, 'rtt')
+                latest_load = history.latest(port, 'load')
+                latest_health = history.latest(port, 'health')
+                latest_errors = history.latest(port, 'error') * 100
+                latest_bandwidth = history.latest(port, 'bandwidth')
                 
                 delta_rtt = delta_load = delta_bandwidth = None
-                if len(data['rtt_history'][port]) > 1:
-                    delta_rtt = f"{(latest_rtt - data['rtt_history'][port][-2])*1000:.1f}ms"
-                if len(data['load_history'][port]) > 1:
-                    delta_load = f"{(latest_load - data['load_history'][port][-2]):.0f}%"
-                if len(data['bandwidth_history'][port]) > 1:
-                    delta_bandwidth = f"{(latest_bandwidth - data['bandwidth_history'][port][-2]):.1f}"
+                if history.count(port) > 1:
+                    delta_rtt = f"{(latest_rtt - history.latest(port, 'rtt', 1))*1000:.1f}ms"
+                    delta_load = f"{(latest_load - history.latest(port, 'load', 1)):.0f}%"
+                    delta_bandwidth = f"{(latest_bandwidth - history.latest(port, 'bandwidth', 1)):.1f}"
                 
                 st.metric("⚡ Response Time", f"{latest_rtt*1000:.1f}ms", delta=delta_rtt)
+                tail = data['tails'].get(port)
+                if tail is not None and not np.isnan(tail[0]):
+                    st.metric("📈 RTT p50 / p95 / p99", " / ".join(f"{q*1000:.0f}" for q in tail) + " ms")
                 st.metric("💻 CPU Load", f"{latest_load:.0f}%", delta=delta_load)
                 st.metric("💚 Health Score", f"{latest_health:.0f}/100")
                 st.metric("📡 Bandwidth", f"{latest_bandwidth:.0f} Mbps", delta=delta_bandwidth)
@@ -858,14 +867,22 @@ def create_professional_metrics():
             else:
                 st.info("⏳ Awaiting data...")
 
-def plot_professional_dashboard(best_server):
-    """Create ultra-professional Plotly charts"""
-    data = st.session_state.monitoring_data
-    if not data['plot_time']:
-        return None
-    
+# Dashboard panels: (series, row, col, y scale, hover label), one trace per server in each
+CHART_PANELS = (
+    ('rtt', 1, 1, 1000, 'RTT: <b>%{y:.2f}ms</b>'),
+    ('load', 1, 2, 1, 'Load: <b>%{y:.1f}%</b>'),
+    ('health', 2, 1, 1, 'Health: <b>%{y:.0f}/100</b>'),
+    ('errors', 2, 2, 1, 'Errors: <b>%{y:.2f}%</b>'),
+    ('bandwidth', 3, 1, 1, 'Bandwidth: <b>%{y:.0f} Mbps</b>'),
+    ('chosen', 3, 2, 1, 'Selections: <b>%{y}</b>'),
+)
+CHART_POINTS = 300  # max points per trace; longer series are LTTB-downsampled
+CHART_COLORS = ['rgb(79, 70, 229)', 'rgb(219, 39, 119)', 'rgb(59, 130, 246)']
+
+def build_dashboard_figure(theme):
+    """The 3x2 dashboard skeleton with empty traces; built once per session and theme"""
     # Theme-based styling
-    if st.session_state.theme == 'dark':
+    if theme == 'dark':
         template = 'plotly_dark'
         paper_bgcolor = 'rgba(10, 14, 39, 0.6)'
         plot_bgcolor = 'rgba(26, 31, 58, 0.6)'
@@ -878,9 +895,6 @@ def plot_professional_dashboard(best_server):
         grid_color = 'rgba(79, 70, 229, 0.2)'
         font_color = '#1e293b'
     
-    # Premium color palette
-    colors = ['rgb(79, 70, 229)', 'rgb(219, 39, 119)', 'rgb(59, 130, 246)']
-    
     # Create 3x2 grid
     fig = make_subplots(
         rows=3, cols=2,
@@ -896,111 +910,27 @@ def plot_professional_dashboard(best_server):
         horizontal_spacing=0.12
     )
     
+    # Traces go in (server, panel) order, so trace idx * len(CHART_PANELS) + k is server idx, panel k
     for idx, port in enumerate(SERVERS):
-        color = colors[idx]
-        is_best = (port == best_server)
-        
-        line_width = 4 if is_best else 2.5
-        opacity = 1.0 if is_best else 0.65
-        
-        # RTT Chart
-        if data['plot_data'][port]['rtt']:
-            rtt_ms = [r*1000 for r in data['plot_data'][port]['rtt'] if not np.isnan(r)]
-            times = data['plot_time'][:len(rtt_ms)]
-            fig.add_trace(go.Scatter(
-                x=times, y=rtt_ms,
-                mode='lines+markers',
-                name=f'Port {port}',
-                line=dict(color=color, width=line_width, shape='spline'),
-                marker=dict(size=8, symbol='circle', line=dict(width=2, color='white')),
-                opacity=opacity,
-                hovertemplate='<b>Port %{fullData.name}</b><br>Time: %{x}s<br>RTT: <b>%{y:.2f}ms</b><extra></extra>',
-                legendgroup=f'port{port}',
-                showlegend=True
-            ), row=1, col=1)
-        
-        # Load Chart
-        if data['plot_data'][port]['load']:
-            loads = [l for l in data['plot_data'][port]['load'] if not np.isnan(l)]
-            times = data['plot_time'][:len(loads)]
-            fig.add_trace(go.Scatter(
-                x=times, y=loads,
-                mode='lines+markers',
-                name=f'Port {port}',
-                line=dict(color=color, width=line_width, shape='spline'),
-                marker=dict(size=8, symbol='circle', line=dict(width=2, color='white')),
-                opacity=opacity,
-                hovertemplate='<b>Port %{fullData.name}</b><br>Time: %{x}s<br>Load: <b>%{y:.1f}%</b><extra></extra>',
-                legendgroup=f'port{port}',
-                showlegend=False
-            ), row=1, col=2)
-        
-        # Health Chart
-        if data['plot_data'][port]['health']:
-            healths = [h for h in data['plot_data'][port]['health'] if not np.isnan(h)]
-            times = data['plot_time'][:len(healths)]
-            fig.add_trace(go.Scatter(
-                x=times, y=healths,
-                mode='lines+markers',
-                name=f'Port {port}',
-                line=dict(color=color, width=line_width, shape='spline'),
-                marker=dict(size=8, symbol='circle', line=dict(width=2, color='white')),
-                opacity=opacity,
-                fill='tonexty' if idx == 0 else None,
-                fillcolor=f'rgba{tuple(list(map(int, color[4:-1].split(","))) + [0.15])}',
-                hovertemplate='<b>Port %{fullData.name}</b><br>Time: %{x}s<br>Health: <b>%{y:.0f}/100</b><extra></extra>',
-                legendgroup=f'port{port}',
-                showlegend=False
-            ), row=2, col=1)
-        
-        # Errors Chart
-        if data['plot_data'][port]['errors']:
-            errors = [e for e in data['plot_data'][port]['errors'] if not np.isnan(e)]
-            times = data['plot_time'][:len(errors)]
-            fig.add_trace(go.Scatter(
-                x=times, y=errors,
-                mode='lines+markers',
-                name=f'Port {port}',
-                line=dict(color=color, width=line_width, shape='spline'),
-                marker=dict(size=8, symbol='circle', line=dict(width=2, color='white')),
-                opacity=opacity,
-                hovertemplate='<b>Port %{fullData.name}</b><br>Time: %{x}s<br>Errors: <b>%{y:.2f}%</b><extra></extra>',
-                legendgroup=f'port{port}',
-                showlegend=False
-            ), row=2, col=2)
-        
-        # Bandwidth Chart
-        if data['plot_data'][port]['bandwidth']:
-            bandwidths = [b for b in data['plot_data'][port]['bandwidth'] if not np.isnan(b)]
-            times = data['plot_time'][:len(bandwidths)]
+        color = CHART_COLORS[idx % len(CHART_COLORS)]
+        rgb = list(map(int, color[4:-1].split(",")))
+        for metric, row, col, _, label in CHART_PANELS:
+            style = dict(mode='lines+markers',
+                         marker=dict(size=8, symbol='circle', line=dict(width=2, color='white')))
+            if metric == 'health':
+                style.update(fill='tonexty' if idx == 0 else None, fillcolor=f'rgba{tuple(rgb + [0.15])}')
+            elif metric == 'chosen':
+                style = dict(mode='lines', fill='tonexty', fillcolor=f'rgba{tuple(rgb + [0.2])}')
             fig.add_trace(go.Scatter(
-                x=times, y=bandwidths,
-                mode='lines+markers',
+                x=[], y=[],
                 name=f'Port {port}',
-                line=dict(color=color, width=line_width, shape='spline'),
-                marker=dict(size=8, symbol='circle', line=dict(width=2, color='white')),
-                opacity=opacity,
-                hovertemplate='<b>Port %{fullData.name}</b><br>Time: %{x}s<br>Bandwidth: <b>%{y:.0f} Mbps</b><extra></extra>',
+                line=dict(color=color, width=2.5, shape='spline'),
+                opacity=0.65,
+                hovertemplate=f'<b>Port %{{fullData.name}}</b><br>Time: %{{x}}s<br>{label}<extra></extra>',
                 legendgroup=f'port{port}',
-                showlegend=False
-            ), row=3, col=1)
-        
-        # Selection History
-        if data['plot_data'][port]['chosen']:
-            chosen_cumsum = np.cumsum(data['plot_data'][port]['chosen'])
-            times = data['plot_time'][:len(chosen_cumsum)]
-            fig.add_trace(go.Scatter(
-                x=times, y=chosen_cumsum,
-                mode='lines',
-                name=f'Port {port}',
-                line=dict(color=color, width=line_width, shape='spline'),
-                opacity=opacity,
-                fill='tonexty',
-                fillcolor=f'rgba{tuple(list(map(int, color[4:-1].split(","))) + [0.2])}',
-                hovertemplate='<b>Port %{fullData.name}</b><br>Time: %{x}s<br>Selections: <b>%{y}</b><extra></extra>',
-                legendgroup=f'port{port}',
-                showlegend=False
-            ), row=3, col=2)
+                showlegend=metric == 'rtt',
+                **style
+            ), row=row, col=col)
     
     # Update layout
     fig.update_layout(
@@ -1056,11 +986,66 @@ def plot_professional_dashboard(best_server):
     
     return fig
 
+def plot_professional_dashboard(best_server, points=CHART_POINTS):
+    """
+    Update the session's dashboard figure in place and return it. Only trace
+    data and the best-server highlight change per round, each trace capped at
+    `points` (None = full resolution), so render cost stays flat as the
+    session grows. Returns None before the first round.
+    """
+    data = st.session_state.monitoring_data
+    store = data['plot_store']
+    if not len(store):
+        return None
+    chart = st.session_state.get('dashboard_chart')
+    if chart is None or chart['theme'] != st.session_state.theme:
+        chart = st.session_state.dashboard_chart = {
+            'theme': st.session_state.theme,
+            'fig': build_dashboard_figure(st.session_state.theme),
+            'drawn': None,
+        }
+    fig = chart['fig']
+    drawn = (id(store), store.appended, best_server, points)
+    if chart['drawn'] == drawn:
+        return fig  # nothing new since the last render
+    
+    plot_time = store.times()
+    with fig.batch_update():
+        for idx, port in enumerate(SERVERS):
+            is_best = (port == best_server)
+            for k, (metric, _, _, scale, _) in enumerate(CHART_PANELS):
+                if metric == 'chosen':
+                    times, values = plot_time, np.cumsum(store.series((port, metric), agg='sum'))
+                else:
+                    values = store.series((port, metric))
+                    present = ~np.isnan(values)
+                    times, values = plot_time[present], values[present] * scale
+                times, values = lttb(times, values, points)
+                trace = fig.data[idx * len(CHART_PANELS) + k]
+                trace.x, trace.y = times, values
+                trace.line.width = 4 if is_best else 2.5
+                trace.opacity = 1.0 if is_best else 0.65
+    chart['drawn'] = drawn
+    return fig
+
+def memoized_export(name, inputs, render):
+    """
+    Rendered export `name` (HTML report, chart page), re-rendered only when
+    `inputs` change. Both are built from running aggregates and the capped
+    dashboard figure, so a render is O(1) in session length and repeat
+    downloads are a dict lookup.
+    """
+    exports = st.session_state.monitoring_data['exports']
+    cached = exports.get(name)
+    if cached is None or cached[0] != inputs:
+        cached = exports[name] = (inputs, render())
+    return cached[1]
+
 def generate_html_report(data, alpha, beta, gamma, delta, eps):
-    """Generate beautiful HTML report"""
+    """Generate beautiful HTML report from the session's running aggregates"""
     counts = data['selection_count']
     best_server = max(counts.keys(), key=lambda k: counts[k]) if counts else None
-    total_rounds = len(data['plot_time'])
+    total_rounds = data['plot_store'].appended
     
     html = f"""
     <!DOCTYPE html>
@@ -1145,6 +1130,9 @@ def generate_html_report(data, alpha, beta, gamma, delta, eps):
                         <tr>
                             <th>Server</th>
                             <th>Avg RTT</th>
+                            <th>p50 RTT</th>
+                            <th>p95 RTT</th>
+                            <th>p99 RTT</th>
                             <th>Avg Load</th>
                             <th>Health</th>
                             <th>Bandwidth</th>
@@ -1156,13 +1144,14 @@ def generate_html_report(data, alpha, beta, gamma, delta, eps):
                     <tbody>
     """
     
-    for port in SERVERS:
-        if len(data['rtt_history'][port]) > 0:
-            avg_rtt = np.mean(list(data['rtt_history'][port])) * 1000
-            avg_load = np.mean(list(data['load_history'][port]))
-            avg_health = np.mean(list(data['health_history'][port]))
-            avg_bandwidth = np.mean(list(data['bandwidth_history'][port]))
-            avg_errors = np.mean(list(data['error_history'][port])) * 100
+    session = data['session']
+    means = session.means()
+    for idx, port in enumerate(SERVERS):
+        if session.count(port) > 0:
+            avg_rtt, avg_load, avg_health, avg_errors, avg_bandwidth, _ = means[idx]
+            avg_rtt *= 1000
+            p50_rtt, p95_rtt, p99_rtt = (q * 1000 for q in session.quantiles(port, 'rtt'))
+            avg_errors *= 100
             selections = counts[port]
             rate = (selections / total_rounds * 100) if total_rounds > 0 else 0
             
@@ -1173,6 +1162,9 @@ def generate_html_report(data, alpha, beta, gamma, delta, eps):
                     <tr class="{row_class}">
                         <td><strong>Port {port}</strong> {badge}</td>
                         <td>{avg_rtt:.2f} ms</td>
+                        <td>{p50_rtt:.2f} ms</td>
+                        <td>{p95_rtt:.2f} ms</td>
+                        <td>{p99_rtt:.2f} ms</td>
                         <td>{avg_load:.1f}%</td>
                         <td>{avg_health:.0f}/100</td>
                         <td>{avg_bandwidth:.0f} Mbps</td>
@@ -1222,71 +1214,77 @@ def generate_html_report(data, alpha, beta, gamma, delta, eps):
     
     return html
 
-def bandit_select(scores_dict, prev_best, epsilon, anti_stick):
-    import random
-    adj = {p: s + (anti_stick if prev_best and p == prev_best else 0.0) 
-           for p, s in scores_dict.items()}
-    if random.random() < epsilon:
-        scores = np.array([adj[p] for p in SERVERS], dtype=float)
-        inv = 1.0 / np.clip(scores, 1e-6, None)
-        prob = inv / inv.sum()
-        return np.random.choice(SERVERS, p=prob)
-    return min(adj.keys(), key=lambda k: adj[k])
+def bandit_select(scores, prev_best, epsilon, anti_stick, strategy="ε-greedy"):
+    """Pick a server from a score array aligned with SERVERS"""
+    if strategy == "Power of two choices":
+        i = power_of_two(scores)
+    elif strategy == "Argmin":
+        i = argmin(scores)
+    else:
+        i = epsilon_greedy(scores, epsilon, SERVER_INDEX.get(prev_best), anti_stick)
+    # Nothing reachable yet: keep the previous pick (or the first server)
+    if i is None:
+        return prev_best if prev_best in SERVER_INDEX else SERVERS[0]
+    return SERVERS[i]
 
-def monitor_round_with_state(round_idx, alpha, beta, gamma, delta, epsilon, anti_stick):
+@st.cache_resource
+def get_telemetry():
+    """One append-only writer per dashboard process, shared across reruns"""
+    return TelemetryWriter(TELEMETRY_PATH)
+
+@st.cache_resource
+def get_subscriber():
+    """Read-only view of collector.py's snapshots; viewers never probe the fleet themselves"""
+    return SnapshotSubscriber()
+
+def monitor_round_with_state(round_idx, alpha, beta, gamma, delta, epsilon, anti_stick, strategy,
+                             zeta=0.3, eta=0.5):
     data = st.session_state.monitoring_data
-    results = {}
+    # Latest snapshot published by the collector process; the dashboard never probes
+    snapshot = get_subscriber().wait_for(data['table_version'], timeout=1.0)
+    if snapshot is None:
+        raise RuntimeError("no collector is publishing snapshots; start it with `python collector.py`")
+    fresh = snapshot.version != data['table_version']
+    data['table_version'] = snapshot.version
+    rows = snapshot.servers
+    results = rows[(rows['probed'] == 1) & np.isin(rows['port'], SERVERS)] if fresh else rows[:0]
+    data['tails'] = {int(r['port']): (float(r['rtt_p50']), float(r['rtt_p95']), float(r['rtt_p99']))
+                     for r in rows}
     
-    for p in SERVERS:
-        try:
-            s = socket.socket()
-            s.settimeout(0.6)
-            start = time.time()
-            s.connect((HOST, p))
-            s.send(b"ping")
-            response = s.recv(2048).decode()
-            end = time.time()
-            s.close()
-            metrics = json.loads(response)
-            metrics['rtt'] = end - start
-            results[p] = metrics
-        except Exception as e:
-            results[p] = None
+    history = data['history']
     
-    for p, metrics in results.items():
-        if metrics is None: continue
-        data['rtt_history'][p].append(metrics['rtt'])
-        data['load_history'][p].append(metrics['load'])
-        data['health_history'][p].append(metrics.get('health_score', 50))
-        err = metrics.get('total_errors', 0) / max(1, metrics.get('total_handled', 1))
-        data['error_history'][p].append(err)
-        data['bandwidth_history'][p].append(metrics.get('bandwidth_mbps', np.random.uniform(400, 600)))
+    for row in results:
+        if not row['up']: continue
+        # The collector already filled in defaults (control_plane.sample_of)
+        sample = (row['rtt'], row['load'], row['health'], row['errors'], row['bandwidth'], row['hit_ratio'])
+        history.append(int(row['port']), sample)
+        data['session'].add(int(row['port']), sample)
     
-    scores = {}
-    for p in SERVERS:
-        if len(data['rtt_history'][p]) == 0:
-            scores[p] = float('inf')
-            continue
-        pred_rtt = float(np.mean(list(data['rtt_history'][p])))
-        pred_load = float(np.mean(list(data['load_history'][p])))
-        pred_health = float(np.mean(list(data['health_history'][p])))
-        err_rate = float(np.mean(list(data['error_history'][p])))
-        pred_bandwidth = float(np.mean(list(data['bandwidth_history'][p])))
-        scores[p] = compute_score(pred_rtt, pred_load, pred_health, err_rate, 
-                                   pred_bandwidth, alpha, beta, gamma, delta, epsilon)
+    # Window means for every server come straight out of the ring, already in feature order;
+    # the collector's p95 RTT is the tail feature after them
+    tails = [data['tails'].get(p, (np.nan,) * 3)[1] for p in SERVERS]
+    matrix = np.column_stack((history.means(), tails))
+    scores = compute_scores(matrix, (alpha, beta, gamma, delta, epsilon, zeta, eta)).scores
     
-    best_server = bandit_select(scores, st.session_state.prev_best, epsilon, anti_stick)
+    best_server = bandit_select(scores, st.session_state.prev_best, epsilon, anti_stick, strategy)
     st.session_state.prev_best = best_server
     data['selection_count'][best_server] += 1
     
-    data['plot_time'].append(round_idx)
+    row = {}
     for p in SERVERS:
-        data['plot_data'][p]['rtt'].append(data['rtt_history'][p][-1] if len(data['rtt_history'][p])>0 else np.nan)
-        data['plot_data'][p]['load'].append(data['load_history'][p][-1] if len(data['load_history'][p])>0 else np.nan)
-        data['plot_data'][p]['health'].append(data['health_history'][p][-1] if len(data['health_history'][p])>0 else np.nan)
-        data['plot_data'][p]['errors'].append((data['error_history'][p][-1]*100) if len(data['error_history'][p])>0 else np.nan)
-        data['plot_data'][p]['bandwidth'].append(data['bandwidth_history'][p][-1] if len(data['bandwidth_history'][p])>0 else np.nan)
-        data['plot_data'][p]['chosen'].append(1 if p == best_server else 0)
+        row[(p, 'rtt')] = history.latest(p, 'rtt')
+        row[(p, 'load')] = history.latest(p, 'load')
+        row[(p, 'health')] = history.latest(p, 'health')
+        row[(p, 'errors')] = history.latest(p, 'error') * 100
+        row[(p, 'bandwidth')] = history.latest(p, 'bandwidth')
+        row[(p, 'chosen')] = 1 if p == best_server else 0
+    data['plot_store'].append(round_idx, row)
+    
+    telemetry = get_telemetry()
+    for row in results:
+        p = int(row['port'])
+        telemetry.record(p, snapshot.updated, row['rtt'], row['load'], row['health'], row['errors'],
+                         row['bandwidth'], scores[SERVER_INDEX[p]], p == best_server)
     
     return best_server
 
@@ -1315,18 +1313,7 @@ if stop_button:
 if start_button:
     st.session_state.monitoring_active = True
     st.session_state.current_round = 0
-    st.session_state.monitoring_data = {
-        'plot_time': [],
-        'plot_data': {p: {'rtt': [], 'load': [], 'health': [], 'errors': [], 'bandwidth': [], 'chosen': []} for p in SERVERS},
-        'rtt_history': {p: deque(maxlen=10) for p in SERVERS},
-        'load_history': {p: deque(maxlen=10) for p in SERVERS},
-        'health_history': {p: deque(maxlen=10) for p in SERVERS},
-        'error_history': {p: deque(maxlen=10) for p in SERVERS},
-        'bandwidth_history': {p: deque(maxlen=10) for p in SERVERS},
-        'selection_count': {p: 0 for p in SERVERS},
-        'session_start': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-        'session_end': None
-    }
+    st.session_state.monitoring_data = new_monitoring_data(datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
     st.session_state.prev_best = None
 
 # Monitoring loop
@@ -1355,7 +1342,8 @@ if st.session_state.monitoring_active:
             break
         
         try:
-            best_server = monitor_round_with_state(r, alpha, beta, gamma, delta, eps, stickiness_penalty)
+            best_server = monitor_round_with_state(r, alpha, beta, gamma, delta, eps, stickiness_penalty,
+                                                   strategy, zeta, eta)
             st.session_state.current_round = r + 1
             progress_bar.progress((r + 1) / rounds)
             
@@ -1374,7 +1362,8 @@ if st.session_state.monitoring_active:
                 
         except Exception as e:
             st.error(f"❌ Error in round {r+1}: {str(e)}")
-            st.info("💡 Ensure all servers are running: `python iperf_server.py 8001/8002/8003`")
+            st.info("💡 Ensure all servers are running: `python iperf_server.py 8001/8002/8003`, "
+                    "plus the collector: `python collector.py`")
             st.session_state.monitoring_active = False
             break
     
@@ -1418,12 +1407,12 @@ if st.session_state.monitoring_active:
             rate = (counts[best_overall] / rounds * 100)
             st.metric("📊 Selection Rate", f"{rate:.1f}%", "Optimal Performance")
         with col3:
-            if len(data['rtt_history'][best_overall]) > 0:
-                avg_rtt = np.mean(list(data['rtt_history'][best_overall])) * 1000
+            if data['session'].count(best_overall) > 0:
+                avg_rtt = data['session'].mean(best_overall, 'rtt') * 1000
                 st.metric("⚡ Avg RTT", f"{avg_rtt:.1f}ms", "Best Server")
         with col4:
-            if len(data['bandwidth_history'][best_overall]) > 0:
-                avg_bw = np.mean(list(data['bandwidth_history'][best_overall]))
+            if data['session'].count(best_overall) > 0:
+                avg_bw = data['session'].mean(best_overall, 'bandwidth')
                 st.metric("📡 Avg Bandwidth", f"{avg_bw:.0f} Mbps", "Best Server")
         
         st.markdown("---")
@@ -1434,7 +1423,10 @@ if st.session_state.monitoring_active:
         col_r1, col_r2 = st.columns(2)
         
         with col_r1:
-            html_report = generate_html_report(data, alpha, beta, gamma, delta, eps)
+            report_inputs = (data['session'].version, data['plot_store'].appended,
+                             alpha, beta, gamma, delta, eps)
+            html_report = memoized_export('report', report_inputs,
+                                          lambda: generate_html_report(data, alpha, beta, gamma, delta, eps))
             st.download_button(
                 label="📄 Download HTML Report",
                 data=html_report,
@@ -1444,9 +1436,12 @@ if st.session_state.monitoring_active:
             )
         
         with col_r2:
+            # The same downsampled figure the dashboard shows, so the export is O(1) in session length
             fig_export = plot_professional_dashboard(best_overall)
             if fig_export:
-                html_chart = fig_export.to_html(include_plotlyjs='cdn')
+                chart_inputs = (st.session_state.dashboard_chart['drawn'], st.session_state.theme)
+                html_chart = memoized_export('charts', chart_inputs,
+                                             lambda: fig_export.to_html(include_plotlyjs='cdn'))
                 st.download_button(
                     label="📊 Download Interactive Charts",
                     data=html_chart,
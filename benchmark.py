@@ -0,0 +1,363 @@
+# benchmark.py - Performance benchmarks for the mini CDN components
+import argparse
+import asyncio
+import multiprocessing
+import os
+import random
+import time
+
+import heapq
+from collections import deque
+
+import numpy as np
+
+from node_state import NodeState, FIELDS, bump_load
+from selection import argmin, epsilon_greedy, power_of_two, BoundedLoadHash, ContentRing
+from cache import POLICIES, make_cache
+
+# ==================== COUNTERS ====================
+
+class LockedNodeState:
+    """Baseline: every counter in one shared row behind a single process lock"""
+    def __init__(self, initial_load=0):
+        self._values = multiprocessing.RawArray('q', len(FIELDS))
+        self.lock = multiprocessing.Lock()
+        self._values[0] = initial_load
+
+    def begin(self):
+        with self.lock:
+            v = self._values
+            v[4] += 1
+            v[1] += 1
+            v[0] = min(100, v[0] + random.randint(2, 6))
+
+    def end(self):
+        with self.lock:
+            v = self._values
+            v[4] = max(0, v[4] - 1)
+            v[0] = max(2, v[0] - random.randint(2, 4))
+
+    def snapshot(self):
+        with self.lock:
+            return dict(zip(FIELDS, self._values))
+
+class ShardedCounters:
+    """Adapter exposing NodeState's per-worker shards through the same calls"""
+    def __init__(self, state, worker_id):
+        self.state = state
+        self.shard = state.shard(worker_id)
+
+    def begin(self):
+        shard = self.shard
+        shard.request_queue += 1
+        shard.connections_handled += 1
+        bump_load(shard, random.randint(2, 6))
+
+    def end(self):
+        shard = self.shard
+        shard.request_queue = max(0, shard.request_queue - 1)
+        bump_load(shard, -random.randint(2, 4))
+
+    def snapshot(self):
+        return self.state.snapshot()
+
+def _counter_worker(counters, connections, requests, barrier, results):
+    """One worker process: `connections` concurrent request loops on one event loop"""
+    async def connection():
+        for _ in range(requests):
+            counters.begin()
+            await asyncio.sleep(0)  # yield like a real request would
+            counters.snapshot()     # calculate_metrics() reads every counter
+            counters.end()
+
+    async def run():
+        await asyncio.gather(*(connection() for _ in range(connections)))
+
+    barrier.wait()
+    start = time.perf_counter()
+    asyncio.run(run())
+    results.put(time.perf_counter() - start)
+
+def bench_counters(args):
+    ctx = multiprocessing.get_context("fork")
+    per_worker = max(1, args.connections // args.workers)
+    total_ops = per_worker * args.workers * args.requests
+    print(f"Counters: {args.workers} workers x {per_worker} concurrent connections "
+          f"x {args.requests} requests ({total_ops} requests total)")
+    print(f"{'Mode':<10} {'Wall (s)':<10} {'Requests/s':<14} {'us/request':<10}")
+    print("-" * 46)
+
+    for mode in ("locked", "sharded"):
+        if mode == "locked":
+            shared = LockedNodeState(initial_load=30)
+            make = lambda i: shared
+        else:
+            state = NodeState(shards=args.workers, initial_load=30)
+            make = lambda i: ShardedCounters(state, i)
+
+        barrier = ctx.Barrier(args.workers)
+        results = ctx.Queue()
+        procs = [ctx.Process(target=_counter_worker,
+                             args=(make(i), per_worker, args.requests, barrier, results))
+                 for i in range(args.workers)]
+        for p in procs:
+            p.start()
+        wall = max(results.get() for _ in procs)
+        for p in procs:
+            p.join()
+
+        print(f"{mode:<10} {wall:<10.3f} {total_ops / wall:<14,.0f} {wall / total_ops * 1e6:<10.2f}")
+
+# ==================== PROXY ====================
+
+async def _request_loop(port, requests, latencies, errors):
+    """One keep-alive client connection sending `requests` pings"""
+    reader = writer = None
+    for _ in range(requests):
+        if writer is None:
+            try:
+                reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            except OSError:
+                errors.append(1)
+                continue
+        start = time.perf_counter()
+        try:
+            writer.write(b"ping\n")
+            await writer.drain()
+            reply = await reader.readline()
+        except OSError:
+            reply = b""
+        if not reply or reply.startswith(b'{"error"'):
+            # Dropped (edge packet loss) or refused: reconnect for the next request
+            errors.append(1)
+            writer.close()
+            writer = None
+            continue
+        latencies.append(time.perf_counter() - start)
+    if writer is not None:
+        writer.close()
+
+async def _load_test(port, connections, requests):
+    latencies, errors = [], []
+    start = time.perf_counter()
+    await asyncio.gather(*(_request_loop(port, requests, latencies, errors)
+                           for _ in range(connections)))
+    return time.perf_counter() - start, latencies, len(errors)
+
+def bench_proxy(args):
+    total = args.connections * args.requests
+    print(f"Proxy: {args.connections} concurrent connections x {args.requests} pings "
+          f"({total} requests per target)")
+    print(f"{'Target':<8} {'Wall (s)':<10} {'Req/s':<10} {'p50 (ms)':<10} {'p95 (ms)':<10} "
+          f"{'p99 (ms)':<10} {'Errors':<8}")
+    print("-" * 70)
+    for port in args.ports:
+        wall, latencies, errors = asyncio.run(_load_test(port, args.connections, args.requests))
+        if latencies:
+            latencies.sort()
+            p50, p95, p99 = (latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000
+                             for q in (0.50, 0.95, 0.99))
+        else:
+            p50 = p95 = p99 = float('nan')
+        print(f"{port:<8} {wall:<10.2f} {len(latencies) / wall:<10,.0f} {p50:<10.1f} {p95:<10.1f} "
+              f"{p99:<10.1f} {errors:<8}")
+
+# ==================== SELECTION ====================
+
+def _simulate_selection(name, args, mu, arrivals, work, keys):
+    """
+    Discrete-event run of one strategy: FIFO edges with service rates `mu`,
+    scores refreshed from queue lengths only every `args.refresh` seconds
+    (like probe rounds), so every strategy decides on stale data.
+    """
+    n = len(mu)
+    queues = [deque() for _ in range(n)]  # finish times of in-flight requests
+    free_at = [0.0] * n
+    scores = np.zeros(n)
+    score_list = scores.tolist()
+    ring = BoundedLoadHash(n) if name == "hash" else None
+    leases = []  # (finish, index) heap for ring releases
+    latencies = np.empty(len(arrivals))
+    herd, window, next_refresh, prev = [], [0] * n, 0.0, None
+    decide = 0.0
+
+    for r, t in enumerate(arrivals):
+        if t >= next_refresh:
+            for i in range(n):
+                q = queues[i]
+                while q and q[0] <= t:
+                    q.popleft()
+                scores[i] = (len(q) + 1) / mu[i]  # expected latency at probe time
+            score_list = scores.tolist()
+            if sum(window):
+                herd.append(max(window) / sum(window))
+            window = [0] * n
+            next_refresh = t + args.refresh
+        while leases and leases[0][0] <= t:
+            ring.release(heapq.heappop(leases)[1])
+
+        start = time.perf_counter()
+        if name == "argmin":
+            i = argmin(scores)
+        elif name == "eps-greedy":
+            i = epsilon_greedy(scores, 0.1, prev)
+        elif name == "p2c":
+            i = power_of_two(score_list)
+        else:
+            i = ring.choose(keys[r], score_list)
+        decide += time.perf_counter() - start
+        prev = i
+
+        finish = max(t, free_at[i]) + work[r] / mu[i]
+        free_at[i] = finish
+        queues[i].append(finish)
+        if ring is not None:
+            heapq.heappush(leases, (finish, i))
+        latencies[r] = finish - t
+        window[i] += 1
+
+    return latencies, float(np.mean(herd)) if herd else 1.0, decide / len(arrivals)
+
+def bench_selection(args):
+    rng = np.random.default_rng(args.seed)
+    random.seed(args.seed)
+    mu = args.rate * rng.uniform(0.5, 1.5, args.servers)  # heterogeneous edge capacity
+    arrivals = np.cumsum(rng.exponential(1.0 / (args.load * mu.sum()), args.requests))
+    work = rng.exponential(1.0, args.requests)
+    keys = [str(k) for k in rng.zipf(1.2, args.requests) % 10000]  # skewed content popularity
+
+    print(f"Selection: {args.servers} edges at {args.load:.0%} utilisation, {args.requests} requests, "
+          f"scores refreshed every {args.refresh}s")
+    print(f"Fair herd share would be ~{mu.max() / mu.sum():.1%} (fastest edge's capacity share)")
+    print(f"{'Strategy':<12} {'p50 (ms)':<10} {'p99 (ms)':<10} {'p99.9 (ms)':<11} "
+          f"{'Herd share':<11} {'us/decision':<10}")
+    print("-" * 66)
+    for name in ("argmin", "eps-greedy", "p2c", "hash"):
+        latencies, herd, decide = _simulate_selection(name, args, mu, arrivals, work, keys)
+        p50, p99, p999 = np.percentile(latencies, (50, 99, 99.9)) * 1000
+        print(f"{name:<12} {p50:<10.1f} {p99:<10.1f} {p999:<11.1f} {herd:<11.1%} {decide * 1e6:<10.2f}")
+
+# ==================== CACHE ====================
+
+def bench_cache(args):
+    """Replay one Zipf-distributed request trace through every eviction policy"""
+    rng = np.random.default_rng(args.seed)
+    keys = (rng.zipf(args.zipf, args.requests) % args.objects).tolist()
+    sizes = rng.integers(1024, 256 * 1024, args.objects).tolist()  # bytes per object
+    capacity = int(args.cache_mb * 1024 * 1024)
+
+    print(f"Cache: {args.requests} requests over {args.objects} objects (zipf {args.zipf}), "
+          f"{args.cache_mb:g} MB cache")
+    print(f"{'Policy':<10} {'Hit ratio':<11} {'Byte hits':<11} {'Evictions':<11} {'ops/s':<10}")
+    print("-" * 55)
+    for policy in POLICIES:
+        cache = make_cache(policy, capacity)
+        miss_bytes = 0
+        start = time.perf_counter()
+        for key in keys:
+            if cache.get(key) is None:
+                body = bytes(sizes[key])
+                miss_bytes += len(body)
+                cache.put(key, body)
+        wall = time.perf_counter() - start
+        stats = cache.stats()
+        byte_hits = stats['hit_bytes'] / (stats['hit_bytes'] + miss_bytes)
+        print(f"{policy:<10} {stats['hit_ratio']:<11.1%} {byte_hits:<11.1%} {stats['evictions']:<11} "
+              f"{len(keys) / wall:<10,.0f}")
+
+# ==================== CONTENT RING ====================
+
+def _moved(before, after):
+    return sum(a != b for a, b in zip(before, after)) / len(before)
+
+def bench_ring(args):
+    """Fleet-wide hit ratio of content sharding vs. spreading, and keys remapped by fleet changes"""
+    rng = np.random.default_rng(args.seed)
+    random.seed(args.seed)
+    trace = (rng.zipf(args.zipf, args.requests) % args.objects).tolist()
+    sizes = rng.integers(1024, 256 * 1024, args.objects).tolist()
+    capacity = int(args.cache_mb * 1024 * 1024)
+    ring = ContentRing(args.servers)
+    scores = [1.0] * args.servers
+
+    print(f"Content ring: {args.servers} edges x {args.cache_mb:g} MB LRU, {args.requests} requests over "
+          f"{args.objects} objects (zipf {args.zipf})")
+    print(f"{'Routing':<10} {'Hit ratio':<11} {'Origin GB':<10}")
+    print("-" * 31)
+    for name in ("p2c", "shard"):
+        caches = [make_cache('lru', capacity) for _ in range(args.servers)]
+        origin = 0
+        for key in trace:
+            i = ring.lookup(str(key)) if name == "shard" else power_of_two(scores)
+            if caches[i].get(key) is None:
+                origin += sizes[key]
+                caches[i].put(key, bytes(sizes[key]))
+        hits = sum(c.hits for c in caches)
+        print(f"{name:<10} {hits / len(trace):<11.1%} {origin / 1e9:<10.2f}")
+
+    keys = [str(k) for k in range(args.objects)]
+    owners = [ring.lookup(k) for k in keys]
+    share = np.bincount(owners, minlength=args.servers) / len(keys)
+    print(f"\nKey share per edge: {share.min():.1%} .. {share.max():.1%} (ideal {1 / args.servers:.1%})")
+    down = list(scores)
+    down[0] = float('inf')
+    ring.reweight(down)
+    print(f"Edge 0 down: {_moved(owners, [ring.lookup(k) for k in keys]):.1%} of keys moved "
+          f"(its own share was {share[0]:.1%})")
+    slow = list(scores)
+    slow[0] = 2.0  # half as good as the rest: half the ring points
+    ring.reweight(slow)
+    print(f"Edge 0 at half weight: {_moved(owners, [ring.lookup(k) for k in keys]):.1%} of keys moved")
+    ring.reweight([s * random.uniform(1.0, 1.1) for s in scores])
+    print(f"Scores jittered by <10%: {_moved(owners, [ring.lookup(k) for k in keys]):.1%} of keys moved")
+
+# ==================== MAIN ====================
+
+def main():
+    parser = argparse.ArgumentParser(description="Mini CDN benchmarks")
+    sub = parser.add_subparsers(dest="bench", required=True)
+
+    p = sub.add_parser("counters", help="edge server load counters: single lock vs per-worker shards")
+    p.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    p.add_argument("--connections", type=int, default=1024, help="concurrent connections across all workers")
+    p.add_argument("--requests", type=int, default=50, help="requests per connection")
+    p.set_defaults(func=bench_counters)
+
+    p = sub.add_parser("proxy", help="throughput/latency through running proxy or edge ports")
+    p.add_argument("ports", type=int, nargs="*", default=[8000],
+                   help="ports to load, e.g. the proxy and one edge for comparison")
+    p.add_argument("--connections", type=int, default=64)
+    p.add_argument("--requests", type=int, default=50, help="pings per connection")
+    p.set_defaults(func=bench_proxy)
+
+    p = sub.add_parser("selection", help="simulated tail latency and herding per selection strategy")
+    p.add_argument("--servers", type=int, default=32)
+    p.add_argument("--requests", type=int, default=100000)
+    p.add_argument("--rate", type=float, default=100.0, help="mean requests/s one edge can serve")
+    p.add_argument("--load", type=float, default=0.8, help="offered load as a fraction of capacity")
+    p.add_argument("--refresh", type=float, default=0.5, help="seconds between score refreshes")
+    p.add_argument("--seed", type=int, default=1)
+    p.set_defaults(func=bench_selection)
+
+    p = sub.add_parser("cache", help="hit ratio and speed of the edge cache eviction policies")
+    p.add_argument("--requests", type=int, default=200000)
+    p.add_argument("--objects", type=int, default=50000)
+    p.add_argument("--zipf", type=float, default=1.1, help="popularity skew")
+    p.add_argument("--cache-mb", type=float, default=256)
+    p.add_argument("--seed", type=int, default=1)
+    p.set_defaults(func=bench_cache)
+
+    p = sub.add_parser("ring", help="fleet hit ratio and remapping of consistent-hash content sharding")
+    p.add_argument("--servers", type=int, default=3)
+    p.add_argument("--requests", type=int, default=200000)
+    p.add_argument("--objects", type=int, default=50000)
+    p.add_argument("--zipf", type=float, default=1.1, help="popularity skew")
+    p.add_argument("--cache-mb", type=float, default=256, help="cache size per edge")
+    p.add_argument("--seed", type=int, default=1)
+    p.set_defaults(func=bench_ring)
+
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
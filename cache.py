@@ -0,0 +1,261 @@
+# cache.py - Size-bounded object caches (LRU, LFU, TinyLFU) with TTLs
+import time
+from collections import OrderedDict
+
+CACHE_BYTES = 64 * 1024 * 1024  # default capacity per cache
+SKETCH_WIDTH = 1 << 14          # TinyLFU frequency sketch counters per row
+SKETCH_ROWS = 4
+SKETCH_MAX = 15                 # 4-bit saturating counters
+SKETCH_SEEDS = (0x9E3779B1, 0x85EBCA77, 0xC2B2AE3D, 0x27D4EB2F)
+_HALVE = bytes(i >> 1 for i in range(256))  # translate table that ages every counter at once
+
+class ObjectCache:
+    """
+    Byte-bounded key -> bytes cache. Subclasses decide eviction order
+    through the _on_* hooks and _victim(); TinyLFU also decides admission.
+    Entries past their TTL are dropped lazily on lookup and count as misses,
+    except that lookup() may still return them, flagged stale, for up to
+    `stale_ttl` more seconds (stale-while-revalidate).
+    Counters: hits, misses, hit_bytes, stale_hits, evictions, expirations.
+    """
+    policy = None
+
+    def __init__(self, capacity=CACHE_BYTES, ttl=None, stale_ttl=0):
+        self.capacity = capacity
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.size = 0
+        self._data = {}  # key -> (value, expires or None)
+        self.hits = 0
+        self.misses = 0
+        self.hit_bytes = 0
+        self.stale_hits = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def get(self, key, now=None):
+        """Cached value, or None on a miss (absent or expired)"""
+        return self._lookup(key, now, 0)[0]
+
+    def lookup(self, key, now=None):
+        """(value, stale): like get(), but serves expired entries within stale_ttl as stale"""
+        return self._lookup(key, now, self.stale_ttl)
+
+    def _lookup(self, key, now, grace):
+        self._on_access(key)
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return None, False
+        value, expires = entry
+        stale = False
+        if expires is not None:
+            now = now if now is not None else time.monotonic()
+            if now >= expires + grace:
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None, False
+            stale = now >= expires
+        self._on_hit(key)
+        self.hits += 1
+        self.hit_bytes += len(value)
+        if stale:
+            self.stale_hits += 1
+        return value, stale
+
+    def put(self, key, value, ttl=None, now=None):
+        """Store `value`; returns False if it was too big or not admitted."""
+        size = len(value)
+        if size > self.capacity:
+            return False
+        if key in self._data:
+            self._remove(key)
+        if self.size + size > self.capacity and not self._admit(key):
+            return False
+        while self.size + size > self.capacity:
+            self._remove(self._victim())
+            self.evictions += 1
+        ttl = self.ttl if ttl is None else ttl
+        expires = (now if now is not None else time.monotonic()) + ttl if ttl else None
+        self._data[key] = (value, expires)
+        self.size += size
+        self._on_insert(key)
+        return True
+
+    def delete(self, key):
+        if key in self._data:
+            self._remove(key)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'policy': self.policy,
+            'items': len(self._data),
+            'bytes': self.size,
+            'capacity': self.capacity,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_bytes': self.hit_bytes,
+            'hit_ratio': self.hits / lookups if lookups else 0.0,
+            'stale_hits': self.stale_hits,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+        }
+
+    def _remove(self, key):
+        value, _ = self._data.pop(key)
+        self.size -= len(value)
+        self._on_remove(key)
+
+    # Policy hooks
+    def _on_access(self, key):
+        pass
+
+    def _on_hit(self, key):
+        pass
+
+    def _on_insert(self, key):
+        pass
+
+    def _on_remove(self, key):
+        pass
+
+    def _admit(self, key):
+        return True
+
+    def _victim(self):
+        raise NotImplementedError
+
+class LRUCache(ObjectCache):
+    """Evicts the least recently used entry"""
+    policy = 'lru'
+
+    def __init__(self, capacity=CACHE_BYTES, ttl=None, stale_ttl=0):
+        super().__init__(capacity, ttl, stale_ttl)
+        self._order = OrderedDict()
+
+    def _on_hit(self, key):
+        self._order.move_to_end(key)
+
+    def _on_insert(self, key):
+        self._order[key] = None
+
+    def _on_remove(self, key):
+        del self._order[key]
+
+    def _victim(self):
+        return next(iter(self._order))
+
+class LFUCache(ObjectCache):
+    """
+    Evicts the least frequently used entry (LRU among equal counts).
+    O(1): keys live in per-frequency buckets and a hit moves a key up one.
+    """
+    policy = 'lfu'
+
+    def __init__(self, capacity=CACHE_BYTES, ttl=None, stale_ttl=0):
+        super().__init__(capacity, ttl, stale_ttl)
+        self._freq = {}
+        self._buckets = {}  # frequency -> OrderedDict of keys
+        self._min_freq = 0
+
+    def _on_hit(self, key):
+        f = self._freq[key]
+        bucket = self._buckets[f]
+        del bucket[key]
+        if not bucket:
+            del self._buckets[f]
+            if self._min_freq == f:
+                self._min_freq = f + 1
+        self._freq[key] = f + 1
+        self._buckets.setdefault(f + 1, OrderedDict())[key] = None
+
+    def _on_insert(self, key):
+        self._freq[key] = 1
+        self._buckets.setdefault(1, OrderedDict())[key] = None
+        self._min_freq = 1
+
+    def _on_remove(self, key):
+        f = self._freq.pop(key)
+        bucket = self._buckets[f]
+        del bucket[key]
+        if not bucket:
+            del self._buckets[f]
+
+    def _victim(self):
+        if self._min_freq not in self._buckets:
+            self._min_freq = min(self._buckets)
+        return next(iter(self._buckets[self._min_freq]))
+
+class FrequencySketch:
+    """
+    Count-min sketch of recent access frequency with 4-bit counters.
+    Every counter is halved after `sample` increments, so old popularity fades.
+    """
+    def __init__(self, width=SKETCH_WIDTH, rows=SKETCH_ROWS):
+        self.width = width
+        self.seeds = SKETCH_SEEDS[:rows]
+        self.mask = width - 1  # width must be a power of two
+        self.table = bytearray(rows * width)  # one flat row after another
+        self.sample = 10 * width
+        self.additions = 0
+
+    def _slots(self, key):
+        h = hash(key)
+        return [row * self.width + (((h ^ seed) * 0x9E3779B97F4A7C15 >> 17) & self.mask)
+                for row, seed in enumerate(self.seeds)]
+
+    def increment(self, key):
+        table = self.table
+        for i in self._slots(key):
+            if table[i] < SKETCH_MAX:
+                table[i] += 1
+        self.additions += 1
+        if self.additions >= self.sample:
+            self.table = table.translate(_HALVE)
+            self.additions //= 2
+
+    def estimate(self, key):
+        table = self.table
+        return min(table[i] for i in self._slots(key))
+
+class TinyLFUCache(LRUCache):
+    """
+    LRU eviction behind a TinyLFU admission filter: when the cache is full,
+    a new key is only admitted if the sketch says it is requested more often
+    than the entry it would evict, so one-hit wonders cannot flush hot objects.
+    """
+    policy = 'tinylfu'
+
+    def __init__(self, capacity=CACHE_BYTES, ttl=None, stale_ttl=0, sketch_width=SKETCH_WIDTH):
+        super().__init__(capacity, ttl, stale_ttl)
+        self.sketch = FrequencySketch(sketch_width)
+        self.rejections = 0
+
+    def _on_access(self, key):
+        self.sketch.increment(key)
+
+    def _admit(self, key):
+        if not self._order:
+            return True
+        if self.sketch.estimate(key) > self.sketch.estimate(self._victim()):
+            return True
+        self.rejections += 1
+        return False
+
+    def stats(self):
+        stats = super().stats()
+        stats['rejections'] = self.rejections
+        return stats
+
+POLICIES = {'lru': LRUCache, 'lfu': LFUCache, 'tinylfu': TinyLFUCache}
+
+def make_cache(policy='lru', capacity=CACHE_BYTES, ttl=None, stale_ttl=0):
+    return POLICIES[policy](capacity, ttl, stale_ttl)
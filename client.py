@@ -1,19 +1,26 @@
 # client.py - Enhanced with iPerf bandwidth monitoring
-import socket
+import argparse
 import time
 import threading
 import numpy as np
-import json
-from collections import deque
-from sklearn.linear_model import LinearRegression
 import matplotlib.pyplot as plt
+import probe
+import profiling
+from profiling import span, profiled
+from predictors import HybridPredictor, SlidingLinearTrend
+from history import HistoryRing
+from timeseries import SeriesStore
+from telemetry import TelemetryWriter
+from control_plane import (ControlPlane, AdaptiveSchedule, sample_of as history_sample, HISTORY_METRICS,
+                           PROBE_INTERVAL, HISTORY_SIZE, TAIL_DECAY)
+from scoring import compute_scores, feature_matrix, RTT, HEALTH, ERROR_RATE, HIT_RATIO, RTT_P95
+from sketch import QuantileSketch
 
 # ---------- CONFIG ----------
 SERVERS = [8001, 8002, 8003]
 HOST = '127.0.0.1'
 ROUNDS = 20
 ROUND_INTERVAL = 1.0
-HISTORY_SIZE = 10
 PREDICT_WINDOW = 5
 
 # Weighted score parameters (updated for bandwidth)
@@ -22,51 +29,52 @@ BETA = 0.5       # weight for load
 GAMMA = 0.3      # weight for health score (inverse)
 DELTA = 0.2      # weight for error rate
 EPSILON = 0.4    # weight for bandwidth (NEW!)
+ZETA = 0.3       # weight for cache miss ratio
+ETA = 0.5        # weight for tail latency (p95 RTT above the predicted RTT)
+WEIGHTS = (ALPHA, BETA, GAMMA, DELTA, EPSILON, ZETA, ETA)
+ANOMALY_PENALTY = 1.5  # score multiplier for servers with an RTT anomaly
 
 SOCKET_TIMEOUT = 0.6
+ROUND_DEADLINE = 1.0  # all probes of a round must finish within this budget
 SHOW_ANALYSIS = True
+TELEMETRY_PATH = "telemetry.bin"  # append-only probe log (None to disable)
 # ----------------------------
 
-# State
-rtt_history = {p: deque(maxlen=HISTORY_SIZE) for p in SERVERS}
-load_history = {p: deque(maxlen=HISTORY_SIZE) for p in SERVERS}
-health_history = {p: deque(maxlen=HISTORY_SIZE) for p in SERVERS}
-error_history = {p: deque(maxlen=HISTORY_SIZE) for p in SERVERS}
-jitter_history = {p: deque(maxlen=HISTORY_SIZE) for p in SERVERS}
-bandwidth_history = {p: deque(maxlen=HISTORY_SIZE) for p in SERVERS}  # NEW!
-
-# For plotting + summary
-plot_time = []
-plot_data = {p: {
-    'rtt': [], 
-    'load': [], 
-    'health': [],
-    'errors': [],
-    'jitter': [],
-    'bandwidth': [],  # NEW!
-    'chosen': [],
-    'scores': []
+# State: one preallocated (servers x metrics x window) ring for all histories
+METRICS = HISTORY_METRICS + ('jitter',)
+history = HistoryRing(SERVERS, METRICS, HISTORY_SIZE)
+
+# Incremental predictors, updated in O(1) as each sample arrives
+predictors = {p: {
+    'rtt': HybridPredictor(PREDICT_WINDOW),
+    'load': HybridPredictor(PREDICT_WINDOW),
+    'bandwidth': HybridPredictor(PREDICT_WINDOW)
 } for p in SERVERS}
 
+# RTT quantile sketches per server, fed by every probe: a decaying one for
+# scoring and the round table, and a whole-run one for the final summary
+tail_sketches = {p: QuantileSketch(decay=TAIL_DECAY) for p in SERVERS}
+rtt_sketches = {p: QuantileSketch() for p in SERVERS}
+
+# For plotting + summary: bounded columnar store, one (port, metric) column each
+PLOT_METRICS = ('rtt', 'load', 'health', 'errors', 'jitter', 'bandwidth', 'chosen', 'scores')
+plot_store = SeriesStore([(p, m) for p in SERVERS for m in PLOT_METRICS])
+
+# Last features of each server, reused when the adaptive schedule skips it
+last_features = {p: ((None, None, None, 0, None), False) for p in SERVERS}
+
 state_lock = threading.Lock()
+telemetry = None  # TelemetryWriter, opened by main()
+
+def report_probe_error(port, exc):
+    print(f"⚠️  Failed to ping server on port {port}: {exc}")
 
 def ping_once(port):
     """Sends a ping; returns metrics dict or None on failure."""
     try:
-        s = socket.socket()
-        s.settimeout(SOCKET_TIMEOUT)
-        start = time.time()
-        s.connect((HOST, port))
-        s.send(b"ping")
-        data = s.recv(2048).decode()
-        end = time.time()
-        s.close()
-        
-        metrics = json.loads(data)
-        metrics['rtt'] = end - start
-        return metrics
+        return probe.ping_once(port, HOST, SOCKET_TIMEOUT)
     except Exception as e:
-        print(f"⚠️  Failed to ping server on port {port}: {e}")
+        report_probe_error(port, e)
         return None
 
 def exponential_smoothing(values, alpha=0.3):
@@ -78,124 +86,179 @@ def exponential_smoothing(values, alpha=0.3):
     return float(smoothed[-1])
 
 def predict_with_regression(values):
-    if len(values) == 0: return None
-    arr = np.array(values); n = len(arr)
-    if n >= 2:
-        m = min(n, PREDICT_WINDOW)
-        y = arr[-m:]; X = np.arange(n-m, n).reshape(-1, 1)
-        model = LinearRegression(); model.fit(X, y)
-        return float(model.predict(np.array([[n]]))[0])
-    else:
-        return float(arr[-1])
+    """One-off trend prediction for a plain list; the monitor loop uses `predictors`."""
+    trend = SlidingLinearTrend(PREDICT_WINDOW)
+    for v in list(values)[-PREDICT_WINDOW:]:
+        trend.update(v)
+    return trend.predict()
 
+@profiled('hybrid_prediction')
 def hybrid_prediction(values):
     smooth = exponential_smoothing(values)
     regress = predict_with_regression(values)
     if smooth is None or regress is None: return smooth or regress
     return 0.6 * regress + 0.4 * smooth
 
+@profiled('compute_score')
 def compute_score(pred_rtt, pred_load, pred_health, error_rate, pred_bandwidth,
-                  alpha=ALPHA, beta=BETA, gamma=GAMMA, delta=DELTA, epsilon=EPSILON):
+                  alpha=ALPHA, beta=BETA, gamma=GAMMA, delta=DELTA, epsilon=EPSILON,
+                  *, hit_ratio=None, zeta=ZETA, rtt_p95=None, eta=ETA):
     """
-    Compute score with bandwidth consideration.
+    Compute score with bandwidth consideration for a single server.
     Lower score is better, but higher bandwidth is better, so we invert it.
+    Use scoring.compute_scores to score a whole fleet in one pass.
     """
     if pred_rtt is None: return float('inf')
-    
-    health_penalty = (100 - pred_health) / 100.0 if pred_health is not None else 1.0
-    
-    # Bandwidth bonus (higher bandwidth = lower score)
-    # Normalize bandwidth (assume max 1000 Mbps)
-    bandwidth_factor = 0
-    if pred_bandwidth is not None and pred_bandwidth > 0:
-        bandwidth_factor = (1000 - pred_bandwidth) / 1000.0  # Invert: lower = better
-    
-    score = (alpha * pred_rtt + 
-             beta * (pred_load / 100.0) + 
-             gamma * health_penalty + 
-             delta * error_rate +
-             epsilon * bandwidth_factor)
-    
-    return score
+    row = feature_matrix([(pred_rtt, pred_load, pred_health, error_rate, pred_bandwidth, hit_ratio,
+                           rtt_p95)])
+    return float(compute_scores(row, (alpha, beta, gamma, delta, epsilon, zeta, eta)).scores[0])
 
 def detect_anomaly(values, threshold=2.0):
     if len(values) < 3: return False
-    arr = np.array(values); mean = np.mean(arr[:-1]); std = np.std(arr[:-1])
+    arr = np.asarray(values); mean = np.mean(arr[:-1]); std = np.std(arr[:-1])
     if std == 0: return False
     return abs((arr[-1] - mean) / std) > threshold
 
-def monitor_round(round_idx):
-    results = {}
-    for p in SERVERS:
-        metrics = ping_once(p)
-        results[p] = metrics
-    
+def sample_of(metrics):
+    """One history sample, in METRICS order: the control plane's sample plus jitter"""
+    return history_sample(metrics) + (metrics.get('jitter', 0),)
+
+@profiled('score_round')
+def score_round(results):
+    """
+    Control-plane scorer: feed one probe round into the histories and
+    predictors, then score the fleet. Servers not probed this round keep
+    their last features. Returns (scores, predictions).
+    """
     with state_lock:
-        predictions = {}
-        for p, metrics in results.items():
+        features = []
+        anomalies = []
+        for p in SERVERS:
+            if p not in results:
+                feature, anomaly = last_features[p]
+                features.append(feature)
+                anomalies.append(anomaly)
+                continue
+            metrics = results[p]
             if metrics is None:
-                predictions[p] = (None, None, None, 0, None, float('inf'), False)
+                last_features[p] = ((None, None, None, 0, None), False)
+                features.append(last_features[p][0])
+                anomalies.append(False)
                 continue
             
             # Update histories
-            rtt_history[p].append(metrics['rtt'])
-            load_history[p].append(metrics['load'])
-            health_history[p].append(metrics.get('health_score', 50))
-            error_rate = metrics.get('total_errors', 0) / max(1, metrics.get('total_handled', 1))
-            error_history[p].append(error_rate)
-            jitter_history[p].append(metrics.get('jitter', 0))
-            bandwidth_history[p].append(metrics.get('bandwidth_mbps', 500))  # NEW!
-            
-            # Predictions
-            pred_rtt = hybrid_prediction(list(rtt_history[p]))
-            pred_load = hybrid_prediction(list(load_history[p]))
-            pred_health = np.mean(list(health_history[p])) if len(health_history[p]) > 0 else 50
-            error_rate = np.mean(list(error_history[p])) if len(error_history[p]) > 0 else 0
-            pred_bandwidth = hybrid_prediction(list(bandwidth_history[p]))  # NEW!
+            sample = sample_of(metrics)
+            bandwidth = sample[history.column('bandwidth')]
+            history.append(p, sample)
+            tail_sketches[p].add(metrics['rtt'])
+            rtt_sketches[p].add(metrics['rtt'])
             
-            is_anomaly = detect_anomaly(list(rtt_history[p]))
-            score = compute_score(pred_rtt, pred_load, pred_health, error_rate, pred_bandwidth)
-            if is_anomaly: score *= 1.5
+            # Predictions (O(1) incremental updates)
+            with span('predict'):
+                pred = predictors[p]
+                pred['rtt'].update(metrics['rtt'])
+                pred['load'].update(metrics['load'])
+                pred['bandwidth'].update(bandwidth)
+                
+                pred_rtt = pred['rtt'].predict()
+                pred_load = pred['load'].predict()
+                pred_bandwidth = pred['bandwidth'].predict()
             
-            predictions[p] = (pred_rtt, pred_load, pred_health, error_rate, pred_bandwidth, score, is_anomaly)
+            last_features[p] = ((pred_rtt, pred_load, None, None, pred_bandwidth),
+                                detect_anomaly(history.window(p, 'rtt')))
+            features.append(last_features[p][0])
+            anomalies.append(last_features[p][1])
         
-        # Pick best server this round
-        best_server = min(predictions.keys(), key=lambda x: predictions[x][5])
+        # Health, error rate and cache hit ratio are window means, read straight from the ring
+        matrix = feature_matrix(features)
+        means = history.means()
+        online = ~np.isnan(matrix[:, RTT])
+        matrix[online, HEALTH] = means[online, history.column('health')]
+        matrix[online, ERROR_RATE] = means[online, history.column('error')]
+        matrix[online, HIT_RATIO] = means[online, history.column('hit_ratio')]
+        tails = np.array([tail_sketches[p].quantile(0.95) for p in SERVERS])
+        matrix[online, RTT_P95] = tails[online]
         
-        # Store for plotting & summary
-        timestamp = round_idx * ROUND_INTERVAL
-        plot_time.append(timestamp)
-        for p in SERVERS:
-            pred_rtt, pred_load, pred_health, error_rate, pred_bandwidth, score, _ = predictions[p]
-            plot_data[p]['rtt'].append(rtt_history[p][-1] if len(rtt_history[p]) > 0 else np.nan)
-            plot_data[p]['load'].append(load_history[p][-1] if len(load_history[p]) > 0 else np.nan)
-            plot_data[p]['health'].append(health_history[p][-1] if len(health_history[p]) > 0 else np.nan)
-            plot_data[p]['errors'].append(error_history[p][-1] * 100 if len(error_history[p]) > 0 else np.nan)
-            plot_data[p]['jitter'].append(jitter_history[p][-1] * 1000 if len(jitter_history[p]) > 0 else np.nan)
-            plot_data[p]['bandwidth'].append(bandwidth_history[p][-1] if len(bandwidth_history[p]) > 0 else np.nan)  # NEW!
-            plot_data[p]['chosen'].append(1 if p == best_server else 0)
-            plot_data[p]['scores'].append(score)
-        
-        # Print round summary with bandwidth
+        # Score the whole fleet in one vectorized pass
+        scores = compute_scores(matrix, WEIGHTS).scores
+        scores = scores * np.where(anomalies, ANOMALY_PENALTY, 1.0)
+        predictions = {p: tuple(None if np.isnan(v) else float(v) for v in matrix[i])
+                          + (float(scores[i]), anomalies[i])
+                       for i, p in enumerate(SERVERS)}
+        return scores, predictions
+
+def record_telemetry(table):
+    """Append every probe result of a routing table to the telemetry log"""
+    if telemetry is None:
+        return
+    for p in table.probed:
+        metrics = table.metrics.get(p)
+        if metrics:
+            rtt, load, health, error_rate = sample_of(metrics)[:4]
+            bandwidth = metrics.get('bandwidth_mbps')
+        else:
+            rtt = load = health = error_rate = bandwidth = None
+        telemetry.record(p, table.updated, rtt, load, health, error_rate, bandwidth,
+                         table.scores[p], p == table.best)
+
+# Probing and scoring run continuously on the control-plane thread; rounds
+# below only read the latest published routing table
+control = ControlPlane(SERVERS, HOST, scorer=score_round, interval=PROBE_INTERVAL,
+                       timeout=SOCKET_TIMEOUT, deadline=ROUND_DEADLINE,
+                       on_error=report_probe_error, on_table=record_telemetry,
+                       schedule=AdaptiveSchedule(SERVERS, PROBE_INTERVAL))
+
+def monitor_round(round_idx):
+    """Record and print one round from the current routing table"""
+    table = control.table
+    if not (control.is_alive() and table.version):
+        table = control.step()  # no control plane running: probe synchronously
+    predictions = table.details
+    best_server = table.best
+    
+    # Store for plotting & summary
+    timestamp = round_idx * ROUND_INTERVAL
+    row = {}
+    for p in SERVERS:
+        metrics = table.metrics.get(p)
+        sample = sample_of(metrics) if metrics else (np.nan,) * len(METRICS)
+        rtt, load, health, error_rate, bandwidth, _, jitter = sample
+        score = table.scores[p]
+        row[(p, 'rtt')] = rtt
+        row[(p, 'load')] = load
+        row[(p, 'health')] = health
+        row[(p, 'errors')] = error_rate * 100
+        row[(p, 'jitter')] = jitter * 1000
+        row[(p, 'bandwidth')] = bandwidth  # NEW!
+        row[(p, 'chosen')] = 1 if p == best_server else 0
+        row[(p, 'scores')] = score if np.isfinite(score) else np.nan  # NaN = unreachable
+    plot_store.append(timestamp, row)
+    
+    # Print round summary with bandwidth
+    with span('print'):
         print(f"\n📊 Round {round_idx + 1}/{ROUNDS}")
-        print(f"{'Port':<8} {'RTT (ms)':<12} {'Load %':<10} {'Health':<10} {'Bandwidth':<15} {'Score':<10}")
-        print("-" * 75)
+        print(f"{'Port':<8} {'RTT (ms)':<12} {'p95 (ms)':<10} {'Load %':<10} {'Health':<10} {'Bandwidth':<15} "
+              f"{'Hit %':<8} {'Score':<10}")
+        print("-" * 94)
         for p in SERVERS:
-            pred_rtt, pred_load, pred_health, _, pred_bw, score, _ = predictions[p]
+            pred_rtt, pred_load, pred_health, _, pred_bw, hit_ratio, rtt_p95, score, _ = predictions[p]
             marker = "⭐" if p == best_server else "  "
             rtt_str = f"{pred_rtt*1000:.1f}" if pred_rtt else "N/A"
             load_str = f"{pred_load:.1f}" if pred_load else "N/A"
             health_str = f"{pred_health:.1f}" if pred_health else "N/A"
             bw_str = f"{pred_bw:.1f} Mbps" if pred_bw else "N/A"
+            p95_str = f"{rtt_p95*1000:.1f}" if rtt_p95 is not None else "N/A"
+            hit_str = f"{hit_ratio*100:.1f}" if hit_ratio is not None else "N/A"
             score_str = f"{score:.3f}" if score != float('inf') else "INF"
-            print(f"{marker} {p:<6} {rtt_str:<12} {load_str:<10} {health_str:<10} {bw_str:<15} {score_str:<10}")
+            print(f"{marker} {p:<6} {rtt_str:<12} {p95_str:<10} {load_str:<10} {health_str:<10} {bw_str:<15} "
+                  f"{hit_str:<8} {score_str:<10}")
 
 def final_summary():
     """Calculate overall best server at the end"""
     avg_scores = {}
     for p in SERVERS:
-        scores = [s for s in plot_data[p]['scores'] if np.isfinite(s)]
-        avg_scores[p] = np.mean(scores) if scores else float('inf')
+        avg = plot_store.mean((p, 'scores'))
+        avg_scores[p] = avg if np.isfinite(avg) else float('inf')
     
     best_server = min(avg_scores, key=avg_scores.get)
     
@@ -203,8 +266,10 @@ def final_summary():
     print(" FINAL SUMMARY (WITH BANDWIDTH)")
     print("="*60)
     for p in SERVERS:
-        avg_bw = np.mean([b for b in plot_data[p]['bandwidth'] if not np.isnan(b)])
-        print(f"Server {p}: Avg Score = {avg_scores[p]:.3f} | Avg Bandwidth = {avg_bw:.1f} Mbps")
+        avg_bw = plot_store.mean((p, 'bandwidth'))
+        p50, p95, p99 = (q * 1000 for q in rtt_sketches[p].quantiles((0.5, 0.95, 0.99)))
+        print(f"Server {p}: Avg Score = {avg_scores[p]:.3f} | Avg Bandwidth = {avg_bw:.1f} Mbps | "
+              f"RTT p50/p95/p99 = {p50:.1f}/{p95:.1f}/{p99:.1f} ms")
     print(f"\n✅ Best Server Overall: {best_server} (Lowest Avg Score {avg_scores[best_server]:.3f})")
     
     return best_server
@@ -213,13 +278,14 @@ def show_analysis():
     """Show plots for analysis including bandwidth"""
     fig, ((ax1, ax2), (ax3, ax4), (ax5, ax6)) = plt.subplots(3, 2, figsize=(16, 12))
     
+    plot_time = plot_store.times()
     for p in SERVERS:
-        ax1.plot(plot_time, plot_data[p]['rtt'], label=f"Server {p}", marker='o', markersize=3)
-        ax2.plot(plot_time, plot_data[p]['load'], label=f"Server {p}", marker='o', markersize=3)
-        ax3.plot(plot_time, plot_data[p]['health'], label=f"Server {p}", marker='o', markersize=3)
-        ax4.plot(plot_time, plot_data[p]['errors'], label=f"Server {p}", marker='o', markersize=3)
-        ax5.plot(plot_time, plot_data[p]['bandwidth'], label=f"Server {p}", marker='o', markersize=3)  # NEW!
-        ax6.plot(plot_time, plot_data[p]['scores'], label=f"Server {p}", marker='o', markersize=3)
+        ax1.plot(plot_time, plot_store.series((p, 'rtt')), label=f"Server {p}", marker='o', markersize=3)
+        ax2.plot(plot_time, plot_store.series((p, 'load')), label=f"Server {p}", marker='o', markersize=3)
+        ax3.plot(plot_time, plot_store.series((p, 'health')), label=f"Server {p}", marker='o', markersize=3)
+        ax4.plot(plot_time, plot_store.series((p, 'errors')), label=f"Server {p}", marker='o', markersize=3)
+        ax5.plot(plot_time, plot_store.series((p, 'bandwidth')), label=f"Server {p}", marker='o', markersize=3)  # NEW!
+        ax6.plot(plot_time, plot_store.series((p, 'scores')), label=f"Server {p}", marker='o', markersize=3)
     
     ax1.set_title("RTT (seconds)"); ax1.set_ylabel("RTT (s)"); ax1.legend(); ax1.grid(True, alpha=0.3)
     ax2.set_title("Server Load (%)"); ax2.set_ylabel("Load (%)"); ax2.legend(); ax2.grid(True, alpha=0.3)
@@ -232,17 +298,49 @@ def show_analysis():
     plt.show()
 
 def main():
+    global telemetry
+    parser = argparse.ArgumentParser(description="Predictive load-balancing client")
+    parser.add_argument("--profile", action="store_true",
+                        help="time each probe/predict/score/print stage and report it at the end")
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help="serve live stage timings as JSON on this port (implies --profile)")
+    args = parser.parse_args()
+    if args.profile or args.metrics_port:
+        profiling.enable()
+    if args.metrics_port:
+        profiling.serve_metrics(args.metrics_port)
+        print(f"Stage timings at http://127.0.0.1:{args.metrics_port}{profiling.METRICS_PATH}")
+    
     print("Starting Enhanced Predictive Load Balancer with iPerf Bandwidth Monitoring...")
     print(f"Monitoring {len(SERVERS)} servers: {SERVERS}")
     print(f"Bandwidth weight (ε): {EPSILON}")
+    if TELEMETRY_PATH:
+        telemetry = TelemetryWriter(TELEMETRY_PATH)
+        print(f"Recording telemetry to {TELEMETRY_PATH}")
     
-    for round_idx in range(ROUNDS):
-        monitor_round(round_idx)
-        time.sleep(ROUND_INTERVAL)
+    control.start()
+    control.wait_for(0, timeout=2 * ROUND_DEADLINE)
+    try:
+        for round_idx in range(ROUNDS):
+            monitor_round(round_idx)
+            time.sleep(ROUND_INTERVAL)
+    finally:
+        control.stop()
+        schedule = control.schedule
+        total = schedule.sent + schedule.skipped
+        if total:
+            print(f"\n📉 Adaptive probing: {schedule.sent}/{total} probes sent "
+                  f"({100 * schedule.skipped / total:.0f}% skipped)")
+        if telemetry is not None:
+            telemetry.close()
     
     # Show summary after all rounds
     best = final_summary()
     
+    if profiling.enabled:
+        print("\n⏱️  Stage timings")
+        print(profiling.report())
+    
     if SHOW_ANALYSIS:
         print("\n📊 Showing Analysis Charts...")
         show_analysis()
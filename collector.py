@@ -0,0 +1,253 @@
+# collector.py - Standalone probe collector publishing fleet snapshots through shared memory
+import argparse
+import mmap
+import os
+import signal
+import tempfile
+import threading
+import time
+from collections import namedtuple
+import numpy as np
+import probe
+import profiling
+from control_plane import ControlPlane, AdaptiveSchedule, WindowScorer, sample_of, PROBE_INTERVAL
+from sketch import QuantileSketch, RELATIVE_ACCURACY
+
+SERVERS = [8001, 8002, 8003]
+# RAM-backed where the platform has it, so publishing never touches a disk
+SNAPSHOT_DIR = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+SNAPSHOT_PATH = os.path.join(SNAPSHOT_DIR, "mini_cdn_snapshot.bin")
+POLL_INTERVAL = 0.01  # seconds between subscriber checks for a new snapshot
+READ_RETRIES = 100    # seqlock retries before a reader gives up on one read
+TAIL_QUANTILES = (0.5, 0.95, 0.99)
+
+# Each row carries its server's RTT sketch as dense bin counts, so sketches
+# from several collectors can be merged. Bins cover SKETCH_MIN_RTT up to
+# about 47 s at RELATIVE_ACCURACY; anything outside lands in the end bins.
+SKETCH_MIN_RTT = 1e-5  # seconds
+SKETCH_BINS = 768
+SKETCH_LO = QuantileSketch(RELATIVE_ACCURACY).index(SKETCH_MIN_RTT)
+
+# Snapshot file = header, then one fixed-size row per server. `seq` is a
+# seqlock: odd while the collector is writing, bumped to even when done.
+MAGIC = b"MCDNSNP\x02"
+HEADER = np.dtype([
+    ('magic', 'S8'),
+    ('seq', '<u8'),
+    ('version', '<u8'),    # routing table version, 0 = nothing probed yet
+    ('updated', '<f8'),    # time.time() of the probe round behind it
+    ('servers', '<u4'),
+    ('best', '<u4'),       # best port, 0 if nothing is reachable
+])
+SERVER_DTYPE = np.dtype([
+    ('port', '<u2'),
+    ('probed', 'u1'),      # probed in this round (else the row repeats older metrics)
+    ('up', 'u1'),          # last probe answered
+    ('rtt', '<f4'),        # seconds; rtt .. hit_ratio as control_plane.sample_of() gives them, NaN while down
+    ('load', '<f4'),
+    ('health', '<f4'),
+    ('errors', '<f4'),     # error rate, 0..1
+    ('bandwidth', '<f4'),  # Mbps
+    ('hit_ratio', '<f4'),
+    ('score', '<f4'),      # inf when unreachable
+    ('rtt_p50', '<f4'),    # seconds, from the collector's decaying RTT sketch; NaN before any sample
+    ('rtt_p95', '<f4'),
+    ('rtt_p99', '<f4'),
+    ('rtt_bins', '<f4', (SKETCH_BINS,)),  # QuantileSketch.to_dense(SKETCH_LO, SKETCH_BINS)
+])
+
+# One consistent copy of the published state; `servers` is a SERVER_DTYPE array
+Snapshot = namedtuple('Snapshot', ['version', 'updated', 'best', 'servers'])
+
+def _tail(sketch):
+    if sketch is None or not sketch.count:
+        return (np.nan,) * len(TAIL_QUANTILES) + (np.zeros(SKETCH_BINS, dtype=np.float32),)
+    return tuple(sketch.quantiles(TAIL_QUANTILES)) + (sketch.to_dense(SKETCH_LO, SKETCH_BINS),)
+
+def _row(port, table, sketch):
+    metrics = table.metrics.get(port)
+    if metrics is None:
+        return (port, port in table.probed, 0) + (np.nan,) * 6 + (table.scores[port],) + _tail(sketch)
+    return (port, port in table.probed, 1) + sample_of(metrics) + (table.scores[port],) + _tail(sketch)
+
+def rtt_sketches(snapshot):
+    """{port: QuantileSketch} rebuilt from one snapshot's rows"""
+    return {int(row['port']): QuantileSketch.from_dense(row['rtt_bins'], SKETCH_LO, RELATIVE_ACCURACY)
+            for row in snapshot.servers}
+
+def merge_rtt_sketches(snapshots):
+    """
+    Fleet-wide {port: QuantileSketch} from the snapshots of several
+    collectors (e.g. one per region probing the same edges): bin counts
+    simply add, so the merged percentiles keep the same relative accuracy.
+    """
+    merged = {}
+    for snapshot in snapshots:
+        for port, sketch in rtt_sketches(snapshot).items():
+            if port in merged:
+                merged[port].merge(sketch)
+            else:
+                merged[port] = sketch
+    return merged
+
+class SnapshotPublisher:
+    """
+    Single writer of the snapshot file. Readers never block it and it
+    never waits for them: publish() marks the seqlock odd, overwrites the
+    rows in place and marks it even again, and readers retry any copy that
+    overlapped a write.
+    """
+    def __init__(self, servers, path=SNAPSHOT_PATH):
+        self.servers = list(servers)
+        self.path = path
+        size = HEADER.itemsize + SERVER_DTYPE.itemsize * len(self.servers)
+        # Build the file aside and rename it in, so readers never map a half-made one
+        with open(path + ".tmp", 'w+b') as f:
+            f.truncate(size)
+            self._map = mmap.mmap(f.fileno(), size)
+        self._header = np.frombuffer(self._map, HEADER, count=1)
+        self._rows = np.frombuffer(self._map, SERVER_DTYPE, count=len(self.servers), offset=HEADER.itemsize)
+        self._header[0] = (MAGIC, 0, 0, 0.0, len(self.servers), 0)
+        self._rows['port'] = self.servers
+        os.replace(path + ".tmp", path)
+        self.published = 0
+
+    def publish(self, table, sketches=None):
+        """Write `table` out, with each server's RTT sketch from `sketches` ({port: QuantileSketch})"""
+        sketches = sketches or {}
+        rows = np.array([_row(p, table, sketches.get(p)) for p in self.servers], dtype=SERVER_DTYPE)
+        seq = int(self._header['seq'][0])
+        self._header['seq'] = seq + 1
+        self._rows[:] = rows
+        self._header['version'] = table.version
+        self._header['updated'] = table.updated
+        self._header['best'] = table.best or 0
+        self._header['seq'] = seq + 2
+        self.published += 1
+
+    def close(self):
+        """Mark the snapshot closed for readers and remove it"""
+        self._header['magic'] = b""
+        del self._header, self._rows
+        self._map.close()
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+class SnapshotSubscriber:
+    """
+    Read-only view of the collector's snapshot. Any number of subscribers
+    cost the fleet nothing: they only copy shared memory. read() returns
+    None while no collector is publishing and reattaches when one
+    (re)starts. Safe to share between threads (e.g. Streamlit sessions):
+    reads and reattaches are serialized, since one thread's reattach would
+    otherwise close the map under another's copy.
+    """
+    def __init__(self, path=SNAPSHOT_PATH):
+        self.path = path
+        self._map = None
+        self._inode = None
+        self._lock = threading.Lock()
+
+    def _attach(self):
+        self._detach()
+        try:
+            with open(self.path, 'rb') as f:
+                self._inode = os.fstat(f.fileno()).st_ino
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (FileNotFoundError, ValueError):
+            return False
+        self._header = np.frombuffer(self._map, HEADER, count=1)
+        count = int(self._header['servers'][0])
+        self._rows = np.frombuffer(self._map, SERVER_DTYPE, count=count, offset=HEADER.itemsize)
+        return True
+
+    def _detach(self):
+        if self._map is not None:
+            del self._header, self._rows
+            self._map.close()
+            self._map = None
+
+    def _replaced(self):
+        """True if a new collector has published a new file since we attached"""
+        try:
+            return os.stat(self.path).st_ino != self._inode
+        except FileNotFoundError:
+            return False
+
+    def read(self):
+        """The latest consistent Snapshot, or None if no collector is running"""
+        with self._lock:
+            return self._read()
+
+    def _read(self):
+        for _ in range(READ_RETRIES):
+            if self._map is None or self._header['magic'][0] != MAGIC or self._replaced():
+                if not self._attach() or self._header['magic'][0] != MAGIC:
+                    return None
+            before = int(self._header['seq'][0])
+            if before & 1:
+                continue  # write in progress
+            header = self._header[0].copy()
+            rows = self._rows.copy()
+            if int(self._header['seq'][0]) == before:
+                return Snapshot(int(header['version']), float(header['updated']),
+                                int(header['best']) or None, rows)
+        return None
+
+    def wait_for(self, version, timeout=None):
+        """Poll until a snapshot newer than `version` is out (or timeout); return the latest"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            snapshot = self.read()
+            if snapshot is not None and snapshot.version > version:
+                return snapshot
+            if deadline is not None and time.monotonic() >= deadline:
+                return snapshot
+            time.sleep(POLL_INTERVAL)
+
+    def close(self):
+        with self._lock:
+            self._detach()
+
+def main():
+    parser = argparse.ArgumentParser(description="Mini CDN probe collector")
+    parser.add_argument("--servers", type=int, nargs="+", default=SERVERS, help="edge ports to probe")
+    parser.add_argument("--interval", type=float, default=PROBE_INTERVAL,
+                        help="seconds between probe rounds")
+    parser.add_argument("--path", default=SNAPSHOT_PATH, help="shared snapshot file")
+    parser.add_argument("--profile", action="store_true",
+                        help="time each probe and scoring stage and report it on shutdown")
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help="serve live stage timings as JSON on this port (implies --profile)")
+    args = parser.parse_args()
+    if args.profile or args.metrics_port:
+        profiling.enable()
+    if args.metrics_port:
+        profiling.serve_metrics(args.metrics_port)
+        print(f"[COLLECTOR] Stage timings at http://127.0.0.1:{args.metrics_port}{profiling.METRICS_PATH}")
+
+    publisher = SnapshotPublisher(args.servers, args.path)
+    scorer = WindowScorer(args.servers)
+    control = ControlPlane(args.servers, probe.HOST, scorer=scorer, interval=args.interval,
+                           schedule=AdaptiveSchedule(args.servers, args.interval),
+                           on_table=lambda table: publisher.publish(table, scorer.sketches))
+    # Unwind like Ctrl+C on SIGTERM, so subscribers see the snapshot closed
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    print(f"[COLLECTOR] Probing {args.servers} every {args.interval}s, publishing to {args.path}")
+    control.start()
+    try:
+        # Sleep rather than join: an interrupted join() can leave the thread looking finished
+        while control.is_alive():
+            time.sleep(1.0)
+    except KeyboardInterrupt:
+        print(f"\n[COLLECTOR] Shutting down after {publisher.published} snapshots")
+    finally:
+        control.stop()
+        publisher.close()
+        if profiling.enabled:
+            print(profiling.report())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+# control_plane.py - Background probing that publishes immutable routing tables
+import math
+import threading
+import time
+from collections import namedtuple
+import numpy as np
+import probe
+from history import HistoryRing
+from scoring import compute_scores, rank, DEFAULT_WEIGHTS
+from sketch import QuantileSketch
+
+PROBE_INTERVAL = 0.25  # seconds between probe rounds
+HISTORY_SIZE = 10
+TAIL_DECAY = 240       # probes per server between halvings of its RTT sketch (~1 min at 4 Hz)
+
+# Adaptive probe scheduling
+VOLATILITY_WINDOW = 5        # recent samples used to judge how much a server swings
+VOLATILITY_THRESHOLD = 0.15  # coefficient of variation (std / mean) of RTT or load
+ALWAYS_PROBE_TOP = 2         # best-ranked servers are probed every round
+LOSING_MARGIN = 0.1          # only back off when the score is 10%+ worse than the best
+MAX_STALENESS = 2.0          # seconds a server may go unprobed, however stable
+
+# History columns, in scoring.FEATURES order so window means feed compute_scores directly
+HISTORY_METRICS = ('rtt', 'load', 'health', 'error', 'bandwidth', 'hit_ratio')
+DEFAULT_HEALTH = 50         # assumed for servers that do not report a health score
+DEFAULT_BANDWIDTH = 500.0   # Mbps assumed for servers without a bandwidth test (edge_server)
+
+# One published snapshot. Never mutated after publication: readers just
+# take `control.table` and use it, with no lock and no waiting for a round.
+#   version  - increases by one per publication (0 = nothing probed yet)
+#   updated  - time.time() of the probe round behind it
+#   scores   - {port: score}, inf when unreachable
+#   order    - ports best first, unreachable ones last
+#   best     - best port, or None if nothing is reachable
+#   metrics  - {port: latest raw probe metrics dict, or None on failure}
+#   details  - extra per-port data from the scorer (e.g. predictions)
+#   probed   - ports actually probed in this round (the rest kept their last metrics)
+RoutingTable = namedtuple('RoutingTable',
+                          ['version', 'updated', 'scores', 'order', 'best', 'metrics', 'details',
+                           'probed'])
+
+def sample_of(metrics):
+    """
+    One probe reply as a sample in HISTORY_METRICS order: the error rate
+    from the error/handled counters, unreported health and bandwidth at
+    their defaults, and a NaN hit ratio for servers without a cache.
+    """
+    hit_ratio = metrics.get('cache_hit_ratio')
+    return (metrics['rtt'], metrics['load'], metrics.get('health_score', DEFAULT_HEALTH),
+            metrics.get('total_errors', 0) / max(1, metrics.get('total_handled', 1)),
+            metrics.get('bandwidth_mbps', DEFAULT_BANDWIDTH),
+            np.nan if hit_ratio is None else hit_ratio)
+
+class WindowScorer:
+    """
+    Default scorer: window means of each metric, plus p95 RTT from a
+    decaying per-server QuantileSketch fed by every probe, through
+    compute_scores. `sketches` is {port: QuantileSketch}. A server whose
+    last probe failed scores inf until it answers again, so it ranks last
+    instead of keeping the window means from before it went down.
+    """
+    def __init__(self, servers, weights=DEFAULT_WEIGHTS, window=HISTORY_SIZE, tail_decay=TAIL_DECAY):
+        self.servers = list(servers)
+        self.weights = weights
+        self.history = HistoryRing(self.servers, HISTORY_METRICS, window)
+        self.sketches = {p: QuantileSketch(decay=tail_decay) for p in self.servers}
+        self._index = {p: i for i, p in enumerate(self.servers)}
+        self.down = np.zeros(len(self.servers), dtype=bool)
+
+    def __call__(self, results):
+        for p, metrics in results.items():
+            self.down[self._index[p]] = metrics is None
+            if metrics is None:
+                continue
+            self.history.append(p, sample_of(metrics))
+            self.sketches[p].add(metrics['rtt'])
+        tails = [self.sketches[p].quantile(0.95) for p in self.servers]
+        scores = compute_scores(np.column_stack((self.history.means(), tails)), self.weights).scores
+        return np.where(self.down, np.inf, scores), {}
+
+class AdaptiveSchedule:
+    """
+    Decides which servers to probe each round. Volatile servers (RTT or load
+    swinging by more than VOLATILITY_THRESHOLD of its mean, the same spread
+    detect_anomaly measures) and the top-ranked candidates are probed every
+    round. Stable servers clearly losing (score LOSING_MARGIN worse than the
+    best) and unreachable ones back off exponentially, but never go more
+    than MAX_STALENESS seconds without a probe.
+    """
+    def __init__(self, servers, interval=PROBE_INTERVAL, max_staleness=MAX_STALENESS,
+                 top=ALWAYS_PROBE_TOP, threshold=VOLATILITY_THRESHOLD, margin=LOSING_MARGIN,
+                 window=VOLATILITY_WINDOW):
+        self.servers = list(servers)
+        self.max_backoff = max(1, math.ceil(max_staleness / interval))  # in rounds
+        self.top = top
+        self.threshold = threshold
+        self.margin = margin
+        self.history = HistoryRing(self.servers, ('rtt', 'load'), window)
+        self.backoff = {p: 1 for p in self.servers}  # rounds between probes
+        self.waited = {p: 0 for p in self.servers}   # rounds since last probe
+        self.sent = 0
+        self.skipped = 0
+
+    def due(self):
+        """Servers to probe this round"""
+        due = []
+        for p in self.servers:
+            self.waited[p] += 1
+            if self.waited[p] >= self.backoff[p]:
+                due.append(p)
+        self.sent += len(due)
+        self.skipped += len(self.servers) - len(due)
+        return due
+
+    def volatility(self, port):
+        """Largest coefficient of variation of RTT and load over the window"""
+        if self.history.count(port) < 3:
+            return float('inf')  # not enough samples to call it stable
+        cv = 0.0
+        for metric in ('rtt', 'load'):
+            values = self.history.window(port, metric)
+            mean = values.mean()
+            if mean > 0:
+                cv = max(cv, values.std() / mean)
+        return cv
+
+    def update(self, results, scores, order):
+        """Set each probed server's next interval from its volatility, score and rank"""
+        top = set(order[:self.top])
+        losing = scores[order[0]] * (1 + self.margin)
+        for p, metrics in results.items():
+            self.waited[p] = 0
+            if metrics is not None:
+                self.history.append(p, (metrics['rtt'], metrics['load']))
+                if p in top or scores[p] <= losing or self.volatility(p) > self.threshold:
+                    self.backoff[p] = 1
+                    continue
+            self.backoff[p] = min(self.max_backoff, self.backoff[p] * 2)
+
+class ControlPlane(threading.Thread):
+    """
+    Probes `servers` every `interval` seconds on its own thread and publishes
+    each result as a new RoutingTable by swapping `self.table` (a single
+    reference assignment, atomic under the GIL). `scorer(results)` returns
+    (scores in server order, details dict) and is only ever called from one
+    thread at a time. `on_table(table)` runs after every publication.
+    With a `schedule` (e.g. AdaptiveSchedule) only the servers it marks due
+    are probed, and the scorer only sees results for those.
+    """
+    def __init__(self, servers, host=probe.HOST, scorer=None, interval=PROBE_INTERVAL,
+                 timeout=probe.SOCKET_TIMEOUT, deadline=probe.ROUND_DEADLINE,
+                 on_error=None, on_table=None, schedule=None):
+        super().__init__(name="control-plane", daemon=True)
+        self.servers = list(servers)
+        self.host = host
+        self.scorer = scorer or WindowScorer(self.servers)
+        self.interval = interval
+        self.timeout = timeout
+        self.deadline = deadline
+        self.on_error = on_error
+        self.on_table = on_table
+        self.schedule = schedule
+        self.table = RoutingTable(0, None, {p: float('inf') for p in self.servers},
+                                  tuple(self.servers), None, {p: None for p in self.servers}, {}, ())
+        self._step_lock = threading.Lock()
+        self._published = threading.Condition()
+        self._stop_event = threading.Event()
+
+    def best(self):
+        return self.table.best
+
+    def step(self):
+        """Probe once, score, publish and return the new table"""
+        with self._step_lock:
+            due = self.schedule.due() if self.schedule else self.servers
+            results = probe.probe_all(due, self.host, self.timeout, self.deadline,
+                                      on_error=self.on_error)
+            scores, details = self.scorer(results)
+            scores = np.asarray(scores, dtype=float)
+            _, top = rank(scores, k=len(self.servers))
+            ranked = [self.servers[i] for i in top]
+            # rank() leaves out unreachable servers; they follow in server order
+            seen = set(ranked)
+            order = tuple(ranked + [p for p in self.servers if p not in seen])
+            metrics = dict(self.table.metrics)
+            metrics.update(results)
+            table = RoutingTable(
+                version=self.table.version + 1,
+                updated=time.time(),
+                scores={p: float(s) for p, s in zip(self.servers, scores)},
+                order=order,
+                best=ranked[0] if ranked else None,
+                metrics=metrics,
+                details=details,
+                probed=tuple(due),
+            )
+            self.table = table
+            if self.schedule:
+                self.schedule.update(results, table.scores, order)
+        with self._published:
+            self._published.notify_all()
+        if self.on_table:
+            self.on_table(table)
+        return table
+
+    def wait_for(self, version, timeout=None):
+        """Block until a table newer than `version` is published (or timeout); return the current one"""
+        with self._published:
+            self._published.wait_for(lambda: self.table.version > version, timeout)
+        return self.table
+
+    def run(self):
+        while not self._stop_event.is_set():
+            start = time.monotonic()
+            try:
+                self.step()
+            except RuntimeError:
+                break  # probe executor already shut down: the interpreter is exiting
+            except Exception as e:
+                print(f"⚠️  Control plane round failed: {e}")
+            self._stop_event.wait(max(0.0, self.interval - (time.monotonic() - start)))
+
+    def stop(self):
+        self._stop_event.set()
+        if self.is_alive():
+            self.join()
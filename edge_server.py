@@ -1,25 +1,68 @@
 # edge_server.py - ENHANCED VERSION
-import socket
-import threading
+import asyncio
+import argparse
+import multiprocessing
 import random
-import time
+import signal
+import socket
 import sys
 import json
+import hashlib
+import os
+import time
+import zlib
+from node_state import NodeState, bump_load
+from cache import POLICIES, make_cache
+from store import SlabStore
+from probe import BackendPool
 
-if len(sys.argv) != 2:
-    print("Usage: python edge_server.py <PORT>")
-    sys.exit(1)
+ROLES = ('edge', 'regional')
+ROLE_CACHE_MB = {'edge': 64, 'regional': 256}  # default cache size per tier
 
-PORT = int(sys.argv[1])
+parser = argparse.ArgumentParser(description="Mini CDN edge server")
+parser.add_argument("port", type=int, help="TCP port to serve on")
+parser.add_argument("--workers", type=int, default=1,
+                    help="worker processes sharing the port via SO_REUSEPORT")
+parser.add_argument("--cache", choices=sorted(POLICIES), default="lru", help="cache eviction policy")
+parser.add_argument("--cache-mb", type=float, default=None,
+                    help="object cache size per worker in MB (default: 64 edge, 256 regional)")
+parser.add_argument("--ttl", type=float, default=300, help="seconds a cached object stays fresh")
+parser.add_argument("--swr", type=float, default=0,
+                    help="stale-while-revalidate: seconds past the TTL an object may still be "
+                         "served while it is refetched in the background (0 = off)")
+parser.add_argument("--store-dir", default=None,
+                    help="keep objects in memory-mapped slab files under this directory, "
+                         "reloaded on restart (the RAM cache then holds only the hot ones)")
+parser.add_argument("--store-mb", type=float, default=1024, help="disk budget of the slab store (MB)")
+parser.add_argument("--role", choices=ROLES, default="edge",
+                    help="cache tier this server reports itself as")
+parser.add_argument("--parent", type=int, default=None,
+                    help="port of a parent (regional) server to ask on a miss before the origin")
+args = parser.parse_args()
+if args.cache_mb is None:
+    args.cache_mb = ROLE_CACHE_MB[args.role]
+if args.parent == args.port:
+    parser.error("a server cannot be its own parent")
+
+PORT = args.port
 HOST = '127.0.0.1'
+WORKERS = max(1, args.workers)
+
+# Persistent server state: one shared-memory row per worker, merged on read
+state = NodeState(shards=WORKERS, initial_load=random.randint(20, 40))
+shard = state.shard(0)  # this process's row, replaced in each forked worker
+
+# Object cache in front of the origin stand-in (one per worker process)
+cache = make_cache(args.cache, int(args.cache_mb * 1024 * 1024), args.ttl, args.swr)
+
+# Single-flight: key -> the one origin fetch task in progress for it
+inflight = {}
 
-# Persistent server state (shared across threads)
-state_lock = threading.Lock()
-current_load = random.randint(20, 40)
-connections_handled = 0
-active_connections = 0
-total_errors = 0
-request_queue = 0
+# On-disk slab store behind the RAM cache, opened per worker in serve()
+store = None
+
+# Keep-alive connections to the parent tier, if any (one pool per worker)
+parent = BackendPool(HOST, args.parent) if args.parent else None
 
 # Enhanced parameters
 LOAD_INCREASE_MIN = 2
@@ -39,122 +82,429 @@ PACKET_LOSS_LOAD_FACTOR = 0.0005  # increases with load
 MAX_QUEUE_SIZE = 20
 OVERLOAD_THRESHOLD = 85
 
+# Accept queue for connection bursts (capped by the kernel's somaxconn)
+LISTEN_BACKLOG = 4096
+
+# Origin stand-in: every key exists, with a size and body derived from the key
+ORIGIN_LATENCY_MIN = 0.05
+ORIGIN_LATENCY_MAX = 0.15
+OBJECT_SIZE_MIN = 1024
+OBJECT_SIZE_MAX = 256 * 1024
+MAX_KEY_LENGTH = 512
+CHUNK_SIZE = 64 * 1024  # bodies are written this much at a time, waiting for the socket in between
+
+# Parent tier: a parent that errors or times out is skipped for the origin
+PARENT_TIMEOUT = 2.0
+PARENT_HIT = ("HIT", "STALE")  # parent reply statuses served from its own cache
+
+# With a slab store, only objects up to this size are held in RAM; bigger ones
+# are always sent from their slab file
+HOT_OBJECT_MAX = 1024 * 1024
+
 def simulate_packet_loss():
     """Simulate packet loss based on current load"""
-    loss_probability = PACKET_LOSS_BASE + (current_load * PACKET_LOSS_LOAD_FACTOR)
+    loss_probability = PACKET_LOSS_BASE + (state.current_load() * PACKET_LOSS_LOAD_FACTOR)
     return random.random() < loss_probability
 
 def calculate_metrics():
-    """Calculate comprehensive server metrics"""
-    with state_lock:
-        # Health score (0-100, higher is better)
-        health = 100 - current_load
-        if current_load > OVERLOAD_THRESHOLD:
-            health = max(0, health - 20)
-        if request_queue > MAX_QUEUE_SIZE * 0.7:
-            health -= 15
-        
-        # Jitter calculation
-        jitter = random.uniform(0, JITTER_MAX) * (current_load / 100.0)
-        
-        return {
-            'load': current_load,
-            'active_connections': active_connections,
-            'total_handled': connections_handled,
-            'total_errors': total_errors,
-            'queue_depth': request_queue,
-            'health_score': max(0, min(100, health)),
-            'jitter': jitter
-        }
-
-def handle_client(conn, addr):
-    global current_load, connections_handled, active_connections, total_errors, request_queue
+    """Calculate comprehensive server metrics for the whole node"""
+    counters = state.snapshot()
+    current_load = counters['current_load']
+    
+    # Health score (0-100, higher is better)
+    health = 100 - current_load
+    if current_load > OVERLOAD_THRESHOLD:
+        health = max(0, health - 20)
+    if counters['request_queue'] > MAX_QUEUE_SIZE * 0.7:
+        health -= 15
     
-    # Add to queue
-    with state_lock:
-        request_queue += 1
-        active_connections += 1
-        connections_handled += 1
-        current_load += random.randint(LOAD_INCREASE_MIN, LOAD_INCREASE_MAX)
-        if current_load > 100:
-            current_load = 100
+    # Jitter calculation
+    jitter = random.uniform(0, JITTER_MAX) * (current_load / 100.0)
     
+    lookups = counters['cache_hits'] + counters['cache_misses']
+    lookup_bytes = counters['cache_hit_bytes'] + counters['cache_miss_bytes']
+    parent_answered = counters['parent_fetches'] - counters['parent_errors']
+    origin_fetches = counters['origin_fetches']
+    
+    metrics = {
+        'load': current_load,
+        'active_connections': counters['active_connections'],
+        'total_handled': counters['connections_handled'],
+        'total_errors': counters['total_errors'],
+        'queue_depth': counters['request_queue'],
+        'health_score': max(0, min(100, health)),
+        'jitter': jitter,
+        'workers': WORKERS,
+        # Cache counters are node-wide; items/bytes describe this worker's cache
+        'cache_policy': cache.policy,
+        'cache_hits': counters['cache_hits'],
+        'cache_misses': counters['cache_misses'],
+        'cache_hit_ratio': counters['cache_hits'] / lookups if lookups else None,
+        'cache_byte_hit_ratio': counters['cache_hit_bytes'] / lookup_bytes if lookup_bytes else None,
+        'cache_items': len(cache),
+        'cache_bytes': cache.size,
+        'cache_evictions': cache.evictions,
+        'cache_stale_served': counters['cache_stale'],
+        'cache_collapsed': counters['cache_collapsed'],
+        'origin_fetches': origin_fetches,
+        # Tier breakdown: how misses here were filled, and how long each tier took
+        'role': args.role,
+        'parent': args.parent,
+        'parent_fetches': counters['parent_fetches'],
+        'parent_hits': counters['parent_hits'],
+        'parent_errors': counters['parent_errors'],
+        'parent_hit_ratio': counters['parent_hits'] / parent_answered if parent_answered else None,
+        'parent_ms': counters['parent_us'] / parent_answered / 1000 if parent_answered else None,
+        'origin_ms': counters['origin_us'] / origin_fetches / 1000 if origin_fetches else None,
+    }
+    if store is not None:
+        # Hits are node-wide; the rest describes this worker's store
+        stored = store.stats()
+        metrics.update({
+            'store_hits': counters['store_hits'],
+            'store_items': stored['items'],
+            'store_bytes': stored['bytes'],
+            'store_disk_bytes': stored['disk_bytes'],
+            'store_slabs': stored['slabs'],
+            'store_loaded': stored['loaded'] + stored['recovered'],
+        })
+    return metrics
+
+def simulate_latency():
+    """Processing latency for one request (base + load + jitter)"""
+    base_latency = random.uniform(BASE_LATENCY_MIN, BASE_LATENCY_MAX)
+    current_load = state.current_load()
+    load_latency = current_load * LOAD_TO_LATENCY_FACTOR
+    jitter = random.uniform(-JITTER_MAX, JITTER_MAX) * (current_load / 100.0)
+    return max(0.01, base_latency + load_latency + jitter)
+
+def begin_request():
+    shard.request_queue += 1
+    shard.connections_handled += 1
+    bump_load(shard, random.randint(LOAD_INCREASE_MIN, LOAD_INCREASE_MAX))
+
+def end_request():
+    shard.request_queue = max(0, shard.request_queue - 1)
+    bump_load(shard, -random.randint(LOAD_DECREASE_MIN, LOAD_DECREASE_MAX))
+
+def count_error():
+    shard.total_errors += 1
+
+async def handle_ping(writer):
+    """Answer one ping; returns False if the connection should be dropped"""
+    # Simulate packet loss
+    if simulate_packet_loss():
+        count_error()
+        return False
+    
+    # Simulate processing without blocking the event loop
+    latency = simulate_latency()
+    await asyncio.sleep(latency)
+    
+    # Get comprehensive metrics
+    metrics = calculate_metrics()
+    metrics['latency'] = latency
+    
+    # Send JSON response, one object per line
+    writer.write(json.dumps(metrics).encode() + b"\n")
+    await writer.drain()
+    return True
+
+def synthesize_object(key):
+    """Deterministic body for `key`, OBJECT_SIZE_MIN..OBJECT_SIZE_MAX bytes"""
+    size = OBJECT_SIZE_MIN + zlib.crc32(key) % (OBJECT_SIZE_MAX - OBJECT_SIZE_MIN + 1)
+    block = hashlib.sha256(key).digest()
+    return (block * (size // len(block) + 1))[:size]
+
+async def fetch_origin(key):
+    """Fetch one object from the (simulated) origin"""
+    await asyncio.sleep(random.uniform(ORIGIN_LATENCY_MIN, ORIGIN_LATENCY_MAX))
+    return synthesize_object(key)
+
+async def fetch_parent(key):
+    """`get` one object from the parent tier; returns (body, parent cache status)"""
+    conn = await asyncio.wait_for(parent.acquire(), PARENT_TIMEOUT)
+    reader, writer = conn
     try:
-        data = conn.recv(1024)
-        if not data:
-            return
-        
-        # Simulate packet loss
-        if simulate_packet_loss():
-            with state_lock:
-                total_errors += 1
-            conn.close()
+        writer.write(b"get " + key + b"\n")
+        await writer.drain()
+        header = json.loads(await asyncio.wait_for(reader.readline(), PARENT_TIMEOUT))
+        body = await asyncio.wait_for(reader.readexactly(header['length']), PARENT_TIMEOUT)
+    except BaseException:
+        parent.discard(conn)  # a reply may still be in flight
+        raise
+    parent.release(conn)
+    return body, header['cache']
+
+async def fetch_upstream(key):
+    """Fill a miss from the parent tier if there is one, else (or if it fails) from the origin"""
+    if parent is not None:
+        shard.parent_fetches += 1
+        start = time.perf_counter()
+        try:
+            body, status = await fetch_parent(key)
+        except (OSError, ValueError, KeyError, asyncio.TimeoutError, asyncio.IncompleteReadError):
+            shard.parent_errors += 1
+        else:
+            shard.parent_us += int((time.perf_counter() - start) * 1e6)
+            if status in PARENT_HIT:
+                shard.parent_hits += 1
+            return body
+    shard.origin_fetches += 1
+    start = time.perf_counter()
+    body = await fetch_origin(key)
+    shard.origin_us += int((time.perf_counter() - start) * 1e6)
+    return body
+
+async def fetch_and_store(key):
+    body = await fetch_upstream(key)
+    if store is not None:
+        store.put(key, body)
+    if store is None or len(body) <= HOT_OBJECT_MAX:
+        cache.put(key, body)
+    return body
+
+def _fetch_done(key, task):
+    del inflight[key]
+    if not task.cancelled():
+        task.exception()  # mark retrieved: background revalidations have no awaiter
+
+def origin_fetch(key):
+    """
+    The upstream fetch for `key` as (task, joined). Starts one unless a fetch
+    is already in flight, in which case the caller joins that one. The task
+    is independent of any client, so a disconnect never cancels it for others.
+    """
+    task = inflight.get(key)
+    if task is not None:
+        return task, True
+    task = inflight[key] = asyncio.create_task(fetch_and_store(key))
+    task.add_done_callback(lambda t: _fetch_done(key, t))
+    return task, False
+
+def parse_range(spec, size):
+    """
+    Byte range `START-END` (inclusive), `START-` or `-SUFFIX` of a `size`-byte
+    object as (start, end exclusive), or None if it is malformed or unsatisfiable.
+    """
+    first, dash, last = spec.partition(b"-")
+    try:
+        if not dash or not (first or last):
+            return None
+        if not first:
+            start, end = max(0, size - int(last)), size
+        else:
+            start = int(first)
+            end = min(size, int(last) + 1) if last else size
+    except ValueError:
+        return None
+    if start < 0 or start >= end:
+        return None
+    return start, end
+
+async def send_chunks(writer, body, start, end):
+    """Write body[start:end] without copying it, one CHUNK_SIZE piece per drain"""
+    view = memoryview(body)
+    for pos in range(start, end, CHUNK_SIZE):
+        writer.write(view[pos:min(end, pos + CHUNK_SIZE)])
+        await writer.drain()
+
+async def handle_get(key, spec, writer):
+    """
+    Serve one object, or the byte range `spec` of it: a JSON header line with
+    the length that follows, then the raw bytes. Ranged replies also carry
+    `range` ([first, last] byte) and the object's full `size`.
+    """
+    body, stale = cache.lookup(key)
+    entry = None  # set when the body is sent from the slab store instead of RAM
+    if body is None and store is not None:
+        entry, stale = store.lookup(key)
+        if entry is not None:
+            shard.store_hits += 1
+            if not stale and entry.length <= HOT_OBJECT_MAX:
+                # Requested again: promote to RAM, keeping the stored expiry
+                body = store.read(entry)
+                if cache.put(key, body, ttl=entry.expires - time.time()):
+                    entry = None
+                else:
+                    body = None  # not admitted: keep sending it from the slab
+    if body is not None or entry is not None:
+        length = len(body) if body is not None else entry.length
+        status = "HIT"
+        shard.cache_hits += 1
+        shard.cache_hit_bytes += length
+        if stale:
+            # Serve the old copy now and revalidate in the background (once per key)
+            status = "STALE"
+            shard.cache_stale += 1
+            origin_fetch(key)
+    else:
+        status = "MISS"
+        shard.cache_misses += 1
+        task, joined = origin_fetch(key)
+        if joined:
+            # Coalesced: wait for the fetch another request already started
+            status = "COALESCED"
+            shard.cache_collapsed += 1
+        body = await asyncio.shield(task)
+        length = len(body)
+        shard.cache_miss_bytes += length
+    
+    header = {'key': key.decode(errors='replace'), 'length': length, 'cache': status}
+    start, end = 0, length
+    if spec:
+        byte_range = parse_range(spec, length)
+        if byte_range is None:
+            writer.write(json.dumps({'error': "bad range", 'size': length}).encode() + b"\n")
+            await writer.drain()
             return
-        
-        # Calculate latency with jitter
-        base_latency = random.uniform(BASE_LATENCY_MIN, BASE_LATENCY_MAX)
-        load_latency = current_load * LOAD_TO_LATENCY_FACTOR
-        jitter = random.uniform(-JITTER_MAX, JITTER_MAX) * (current_load / 100.0)
-        latency = max(0.01, base_latency + load_latency + jitter)
-        
-        # Simulate processing
-        time.sleep(latency)
-        
-        # Get comprehensive metrics
-        metrics = calculate_metrics()
-        metrics['latency'] = latency
-        
-        # Send JSON response
-        response = json.dumps(metrics)
-        conn.send(response.encode())
+        start, end = byte_range
+        header.update(length=end - start, range=[start, end - 1], size=length)
+    writer.write(json.dumps(header).encode() + b"\n")
+    if entry is not None:
+        await store.send(writer, entry, start, end)
+    else:
+        await send_chunks(writer, body, start, end)
+
+async def handle_client(reader, writer):
+    """
+    Keep-alive protocol: the client sends newline-terminated commands and
+    gets one newline-terminated JSON reply per command on the same connection.
+    `ping` returns metrics; `get <key> [range]` returns a JSON header line
+    with the body length, followed by exactly that many body bytes.
+    """
+    shard.active_connections += 1
+    
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                break  # client closed the connection
+            command, _, rest = line.strip().partition(b" ")
+            key, _, spec = rest.partition(b" ")
+            if not command:
+                continue
+            if command == b"get" and not 0 < len(key) <= MAX_KEY_LENGTH:
+                writer.write(b'{"error": "bad key"}\n')
+                await writer.drain()
+                continue
+            if command not in (b"ping", b"get"):
+                writer.write(b'{"error": "unknown command"}\n')
+                await writer.drain()
+                continue
+            
+            # Add to queue
+            begin_request()
+            try:
+                if command == b"get":
+                    await handle_get(key, spec, writer)
+                elif not await handle_ping(writer):
+                    break
+            finally:
+                end_request()
         
     except Exception as e:
-        with state_lock:
-            total_errors += 1
+        count_error()
     finally:
-        conn.close()
-        with state_lock:
-            request_queue = max(0, request_queue - 1)
-            decrease = random.randint(LOAD_DECREASE_MIN, LOAD_DECREASE_MAX)
-            current_load = max(2, current_load - decrease)
-            active_connections -= 1
-
-def background_load_fluctuation():
+        writer.close()
+        shard.active_connections -= 1
+
+async def background_load_fluctuation():
     """Simulate realistic background load changes"""
-    global current_load
     while True:
-        time.sleep(random.uniform(2, 5))
-        with state_lock:
-            # Random load fluctuation
-            change = random.randint(-5, 5)
-            current_load = max(5, min(95, current_load + change))
+        await asyncio.sleep(random.uniform(2, 5))
+        # Random load fluctuation
+        change = random.randint(-5, 5)
+        state.adjust_load(shard, change, 5, 95)
 
-def start_server():
-    s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-    
+def raise_fd_limit():
+    """Lift the soft open-files limit to the hard limit so 10k+ sockets fit"""
+    try:
+        import resource
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        if soft < hard:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    except (ImportError, ValueError, OSError):
+        pass  # not available on this platform
+
+def open_store(worker_id):
+    """This worker's slab store; workers each get their own subdirectory"""
+    directory = args.store_dir if WORKERS == 1 else os.path.join(args.store_dir, f"worker-{worker_id}")
+    return SlabStore(directory, int(args.store_mb * 1024 * 1024), args.ttl, args.swr)
+
+async def serve(worker_id=0):
+    global store
+    if args.store_dir:
+        store = open_store(worker_id)
     try:
-        s.bind((HOST, PORT))
+        server = await asyncio.start_server(handle_client, HOST, PORT,
+                                            backlog=LISTEN_BACKLOG, reuse_address=True,
+                                            reuse_port=WORKERS > 1)
     except OSError as e:
         print(f"Error binding to {HOST}:{PORT} -> {e}")
         sys.exit(1)
     
-    s.listen(50)
-    print(f"[SERVER {PORT}] Running on {HOST}:{PORT} (initial load {current_load}%)")
+    if worker_id == 0:
+        upstream = f"parent {args.parent}" if args.parent else "origin"
+        print(f"[SERVER {PORT}] Running on {HOST}:{PORT} as {args.role} (initial load "
+              f"{state.current_load()}%, {cache.policy} cache {args.cache_mb:g} MB, misses -> {upstream})")
+        if store is not None:
+            print(f"[SERVER {PORT}] Slab store {args.store_dir} ({args.store_mb:g} MB): "
+                  f"{store.loaded} objects from the index, {store.recovered} recovered from slabs")
+        # Background load fluctuation is node-wide, so only one worker runs it
+        # (keep a reference so the task is not collected)
+        bg_task = asyncio.create_task(background_load_fluctuation())
+    
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        if parent is not None:
+            parent.close_all()
+        if store is not None:
+            store.close()  # persists the index for the next start
+
+def run_worker(worker_id):
+    global shard
+    shard = state.shard(worker_id)
+    # The parent stops workers with SIGTERM; unwind like Ctrl+C so the store index is saved
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    try:
+        asyncio.run(serve(worker_id))
+    except KeyboardInterrupt:
+        pass
+
+def start_server():
+    raise_fd_limit()
+    if WORKERS == 1:
+        signal.signal(signal.SIGTERM, signal.default_int_handler)  # save the store index on kill
+        try:
+            asyncio.run(serve())
+        except KeyboardInterrupt:
+            print("\n[SERVER] Shutting down")
+        return
+    
+    if not hasattr(socket, "SO_REUSEPORT"):
+        print("--workers needs SO_REUSEPORT, which this platform does not support")
+        sys.exit(1)
     
-    # Start background load fluctuation thread
-    bg_thread = threading.Thread(target=background_load_fluctuation, daemon=True)
-    bg_thread.start()
+    # Fork so every worker inherits the shared-memory state
+    ctx = multiprocessing.get_context("fork")
+    workers = [ctx.Process(target=run_worker, args=(i,), daemon=True) for i in range(WORKERS)]
+    for w in workers:
+        w.start()
+    print(f"[SERVER {PORT}] {WORKERS} workers sharing {HOST}:{PORT} via SO_REUSEPORT")
     
+    # Treat SIGTERM like Ctrl+C so workers never outlive the parent
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
     try:
-        while True:
-            conn, addr = s.accept()
-            t = threading.Thread(target=handle_client, args=(conn, addr), daemon=True)
-            t.start()
+        for w in workers:
+            w.join()
     except KeyboardInterrupt:
         print("\n[SERVER] Shutting down")
     finally:
-        s.close()
+        for w in workers:
+            w.terminate()
 
 if __name__ == "__main__":
-    start_server()
\ No newline at end of file
+    start_server()
@@ -0,0 +1,59 @@
+# history.py - Preallocated ring buffer for per-server metric histories
+import numpy as np
+
+class HistoryRing:
+    """
+    Last `window` samples of every metric for every server in one
+    (servers x metrics x 2*window) float array. Each sample is written twice,
+    at slot h and h + window, so the newest samples are always one contiguous
+    slice: window() returns a NumPy view and never copies or allocates.
+    Missing samples are simply not appended (histories only grow on success).
+    """
+    def __init__(self, servers, metrics, window):
+        self.servers = list(servers)
+        self.metrics = tuple(metrics)
+        self.size = window
+        self._server_index = {p: i for i, p in enumerate(self.servers)}
+        self._metric_index = {m: i for i, m in enumerate(self.metrics)}
+        self._buf = np.full((len(self.servers), len(self.metrics), 2 * window), np.nan)
+        self._head = np.zeros(len(self.servers), dtype=np.int64)   # next slot to write
+        self._count = np.zeros(len(self.servers), dtype=np.int64)  # valid samples (<= window)
+
+    def append(self, port, values):
+        """Record one sample for `port`; `values` is in `metrics` order."""
+        i = self._server_index[port]
+        h = self._head[i]
+        self._buf[i, :, h] = values
+        self._buf[i, :, h + self.size] = values
+        self._head[i] = (h + 1) % self.size
+        if self._count[i] < self.size:
+            self._count[i] += 1
+
+    def count(self, port):
+        return int(self._count[self._server_index[port]])
+
+    def window(self, port, metric):
+        """Zero-copy view of the stored samples for one metric, oldest first."""
+        i = self._server_index[port]
+        end = self._head[i] + self.size
+        return self._buf[i, self._metric_index[metric], end - self._count[i]:end]
+
+    def latest(self, port, metric, back=0):
+        """Newest sample (back=0), the one before it (back=1), ... or NaN."""
+        i = self._server_index[port]
+        if back >= self._count[i]:
+            return np.nan
+        return float(self._buf[i, self._metric_index[metric], self._head[i] + self.size - 1 - back])
+
+    def means(self):
+        """(servers x metrics) window means in one vectorized pass; NaN with no samples."""
+        # The first half of the buffer holds exactly the live window (unwritten slots are
+        # NaN), and NaN samples (a metric a server does not report) are skipped too
+        live = self._buf[:, :, :self.size]
+        totals = np.nansum(live, axis=2)
+        counts = np.count_nonzero(~np.isnan(live), axis=2)
+        return np.divide(totals, counts, out=np.full(totals.shape, np.nan), where=counts > 0)
+
+    def column(self, metric):
+        """Index of `metric` along the metrics axis of means()."""
+        return self._metric_index[metric]
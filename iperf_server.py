@@ -1,6 +1,5 @@
 # iperf_server.py - Enhanced edge server with iPerf bandwidth testing
-import socket
-import threading
+import asyncio
 import random
 import time
 import sys
@@ -18,8 +17,7 @@ HOST = '127.0.0.1'
 # iPerf port will be PORT + 1000 (e.g., 8001 -> 9001)
 IPERF_PORT = PORT + 1000
 
-# Persistent server state
-state_lock = threading.Lock()
+# Persistent server state (only touched from the event loop thread)
 current_load = random.randint(20, 40)
 connections_handled = 0
 active_connections = 0
@@ -44,6 +42,9 @@ PACKET_LOSS_LOAD_FACTOR = 0.0005
 MAX_QUEUE_SIZE = 20
 OVERLOAD_THRESHOLD = 85
 
+# Accept queue for connection bursts (capped by the kernel's somaxconn)
+LISTEN_BACKLOG = 4096
+
 def start_iperf_server():
     """Start iPerf3 server in the background"""
     try:
@@ -91,149 +92,177 @@ def calculate_metrics():
     """Calculate comprehensive server metrics including bandwidth"""
     global last_bandwidth_test, bandwidth_mbps
     
-    with state_lock:
-        # Update bandwidth every 5 seconds
-        if time.time() - last_bandwidth_test > 5:
-            bandwidth_mbps = run_bandwidth_test()
-            last_bandwidth_test = time.time()
-        
-        # Health score (0-100, higher is better)
-        health = 100 - current_load
-        if current_load > OVERLOAD_THRESHOLD:
-            health = max(0, health - 20)
-        if request_queue > MAX_QUEUE_SIZE * 0.7:
-            health -= 15
-        
-        # Jitter calculation
-        jitter = random.uniform(0, JITTER_MAX) * (current_load / 100.0)
-        
-        return {
-            'load': current_load,
-            'active_connections': active_connections,
-            'total_handled': connections_handled,
-            'total_errors': total_errors,
-            'queue_depth': request_queue,
-            'health_score': max(0, min(100, health)),
-            'jitter': jitter,
-            'bandwidth_mbps': round(bandwidth_mbps, 2),
-            'iperf_port': IPERF_PORT
-        }
-
-def handle_client(conn, addr):
-    global current_load, connections_handled, active_connections, total_errors, request_queue
+    # Update bandwidth every 5 seconds
+    if time.time() - last_bandwidth_test > 5:
+        bandwidth_mbps = run_bandwidth_test()
+        last_bandwidth_test = time.time()
     
-    # Add to queue
-    with state_lock:
-        request_queue += 1
-        active_connections += 1
-        connections_handled += 1
-        current_load += random.randint(LOAD_INCREASE_MIN, LOAD_INCREASE_MAX)
-        if current_load > 100:
-            current_load = 100
+    # Health score (0-100, higher is better)
+    health = 100 - current_load
+    if current_load > OVERLOAD_THRESHOLD:
+        health = max(0, health - 20)
+    if request_queue > MAX_QUEUE_SIZE * 0.7:
+        health -= 15
+    
+    # Jitter calculation
+    jitter = random.uniform(0, JITTER_MAX) * (current_load / 100.0)
+    
+    return {
+        'load': current_load,
+        'active_connections': active_connections,
+        'total_handled': connections_handled,
+        'total_errors': total_errors,
+        'queue_depth': request_queue,
+        'health_score': max(0, min(100, health)),
+        'jitter': jitter,
+        'bandwidth_mbps': round(bandwidth_mbps, 2),
+        'iperf_port': IPERF_PORT
+    }
+
+def simulate_latency():
+    """Processing latency for one request (base + load + jitter)"""
+    base_latency = random.uniform(BASE_LATENCY_MIN, BASE_LATENCY_MAX)
+    load_latency = current_load * LOAD_TO_LATENCY_FACTOR
+    jitter = random.uniform(-JITTER_MAX, JITTER_MAX) * (current_load / 100.0)
+    return max(0.01, base_latency + load_latency + jitter)
+
+def begin_request():
+    global current_load, connections_handled, request_queue
+    request_queue += 1
+    connections_handled += 1
+    current_load += random.randint(LOAD_INCREASE_MIN, LOAD_INCREASE_MAX)
+    if current_load > 100:
+        current_load = 100
+
+def end_request():
+    global current_load, request_queue
+    request_queue = max(0, request_queue - 1)
+    decrease = random.randint(LOAD_DECREASE_MIN, LOAD_DECREASE_MAX)
+    current_load = max(2, current_load - decrease)
+
+async def handle_ping(writer):
+    """Answer one ping; returns False if the connection should be dropped"""
+    global total_errors
+    
+    # Simulate packet loss
+    if simulate_packet_loss():
+        total_errors += 1
+        return False
+    
+    # Simulate processing without blocking the event loop
+    latency = simulate_latency()
+    await asyncio.sleep(latency)
+    
+    # Get comprehensive metrics including bandwidth
+    metrics = calculate_metrics()
+    metrics['latency'] = latency
+    
+    # Send JSON response, one object per line
+    writer.write(json.dumps(metrics).encode() + b"\n")
+    await writer.drain()
+    return True
+
+async def handle_client(reader, writer):
+    """
+    Keep-alive protocol: the client sends newline-terminated commands and
+    gets one newline-terminated JSON reply per command on the same connection.
+    """
+    global total_errors, active_connections
+    active_connections += 1
     
     try:
-        data = conn.recv(1024)
-        if not data:
-            return
-        
-        # Simulate packet loss
-        if simulate_packet_loss():
-            with state_lock:
-                total_errors += 1
-            conn.close()
-            return
-        
-        # Calculate latency with jitter
-        base_latency = random.uniform(BASE_LATENCY_MIN, BASE_LATENCY_MAX)
-        load_latency = current_load * LOAD_TO_LATENCY_FACTOR
-        jitter = random.uniform(-JITTER_MAX, JITTER_MAX) * (current_load / 100.0)
-        latency = max(0.01, base_latency + load_latency + jitter)
-        
-        # Simulate processing
-        time.sleep(latency)
-        
-        # Get comprehensive metrics including bandwidth
-        metrics = calculate_metrics()
-        metrics['latency'] = latency
-        
-        # Send JSON response
-        response = json.dumps(metrics)
-        conn.send(response.encode())
+        while True:
+            line = await reader.readline()
+            if not line:
+                break  # client closed the connection
+            command = line.strip()
+            if not command:
+                continue
+            if command != b"ping":
+                writer.write(b'{"error": "unknown command"}\n')
+                await writer.drain()
+                continue
+            
+            # Add to queue
+            begin_request()
+            try:
+                if not await handle_ping(writer):
+                    break
+            finally:
+                end_request()
         
     except Exception as e:
-        with state_lock:
-            total_errors += 1
+        total_errors += 1
     finally:
-        conn.close()
-        with state_lock:
-            request_queue = max(0, request_queue - 1)
-            decrease = random.randint(LOAD_DECREASE_MIN, LOAD_DECREASE_MAX)
-            current_load = max(2, current_load - decrease)
-            active_connections -= 1
-
-def background_load_fluctuation():
+        writer.close()
+        active_connections -= 1
+
+async def background_load_fluctuation():
     """Simulate realistic background load changes"""
     global current_load
     while True:
-        time.sleep(random.uniform(2, 5))
-        with state_lock:
-            # Random load fluctuation
-            change = random.randint(-5, 5)
-            current_load = max(5, min(95, current_load + change))
+        await asyncio.sleep(random.uniform(2, 5))
+        # Random load fluctuation
+        change = random.randint(-5, 5)
+        current_load = max(5, min(95, current_load + change))
 
-def periodic_bandwidth_update():
+async def periodic_bandwidth_update():
     """Periodically update bandwidth measurements"""
     global bandwidth_mbps
     while True:
-        time.sleep(5)
+        await asyncio.sleep(5)
         bandwidth_mbps = run_bandwidth_test()
 
-def start_server():
+async def restart_iperf():
+    """Restart iPerf server (the -1 flag exits after one connection)"""
+    while True:
+        await asyncio.sleep(10)
+        start_iperf_server()
+
+def raise_fd_limit():
+    """Lift the soft open-files limit to the hard limit so 10k+ sockets fit"""
+    try:
+        import resource
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        if soft < hard:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    except (ImportError, ValueError, OSError):
+        pass  # not available on this platform
+
+async def serve():
     # Start iPerf server
     iperf_started = start_iperf_server()
     
-    s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-    
     try:
-        s.bind((HOST, PORT))
+        server = await asyncio.start_server(handle_client, HOST, PORT,
+                                            backlog=LISTEN_BACKLOG, reuse_address=True)
     except OSError as e:
         print(f"Error binding to {HOST}:{PORT} -> {e}")
         sys.exit(1)
     
-    s.listen(50)
     print(f"[SERVER {PORT}] Running on {HOST}:{PORT}")
     print(f"[SERVER {PORT}] Metrics endpoint: {PORT}")
     if iperf_started:
         print(f"[SERVER {PORT}] iPerf endpoint: {IPERF_PORT}")
     print(f"[SERVER {PORT}] Initial load: {current_load}%")
     
-    # Start background threads
-    bg_thread = threading.Thread(target=background_load_fluctuation, daemon=True)
-    bg_thread.start()
-    
-    bw_thread = threading.Thread(target=periodic_bandwidth_update, daemon=True)
-    bw_thread.start()
-    
-    # Restart iPerf server thread (since -1 flag exits after one connection)
-    def restart_iperf():
-        while True:
-            time.sleep(10)
-            start_iperf_server()
-    
+    # Start background tasks (keep references so they are not collected)
+    tasks = [
+        asyncio.create_task(background_load_fluctuation()),
+        asyncio.create_task(periodic_bandwidth_update()),
+    ]
     if iperf_started:
-        iperf_restart_thread = threading.Thread(target=restart_iperf, daemon=True)
-        iperf_restart_thread.start()
+        tasks.append(asyncio.create_task(restart_iperf()))
     
+    async with server:
+        await server.serve_forever()
+
+def start_server():
+    raise_fd_limit()
     try:
-        while True:
-            conn, addr = s.accept()
-            t = threading.Thread(target=handle_client, args=(conn, addr), daemon=True)
-            t.start()
+        asyncio.run(serve())
     except KeyboardInterrupt:
         print(f"\n[SERVER {PORT}] Shutting down")
-    finally:
-        s.close()
 
 if __name__ == "__main__":
     start_server()
@@ -0,0 +1,58 @@
+# node_state.py - Edge server counters in shared memory, sharded per worker process
+import ctypes
+import multiprocessing
+import numpy as np
+
+FIELDS = ('current_load', 'connections_handled', 'active_connections',
+          'total_errors', 'request_queue',
+          'cache_hits', 'cache_misses', 'cache_hit_bytes', 'cache_miss_bytes',
+          'cache_stale', 'cache_collapsed', 'origin_fetches',
+          'parent_fetches', 'parent_hits', 'parent_errors', 'parent_us', 'origin_us',
+          'store_hits')
+
+class Shard(ctypes.Structure):
+    """
+    One worker's row of counters. Only the owning worker writes it, and a
+    worker's event loop is single-threaded, so updates need no lock.
+    `current_load` holds this worker's contribution to the node load; the
+    request hot path clamps it per shard with `bump_load` and never reads
+    the other rows.
+    """
+    _fields_ = [(name, ctypes.c_int64) for name in FIELDS]
+
+class NodeState:
+    """
+    Node-wide load counters, one row (shard) per worker. Create it before
+    forking workers; readers merge all rows, so metrics describe the whole
+    node while the request hot path never takes a cross-process lock.
+    """
+    def __init__(self, shards=1, initial_load=0):
+        self.rows = multiprocessing.RawArray(Shard, shards)
+        self.rows[0].current_load = initial_load
+        # (shards, fields) int64 view of the same memory: a merged read is one vectorized sum
+        self._table = np.frombuffer(self.rows, dtype=np.int64).reshape(shards, len(FIELDS))
+
+    def shard(self, index):
+        """Writable view of one worker's row"""
+        return self.rows[index]
+
+    def current_load(self):
+        return max(0, min(100, int(self._table[:, 0].sum())))
+
+    def adjust_load(self, shard, delta, low, high):
+        """
+        Move the node-wide load by `delta`, clamped to [low, high], via `shard`.
+        Reads every row, so keep it off the per-request path.
+        """
+        node_load = self.current_load()
+        shard.current_load += max(low, min(high, node_load + delta)) - node_load
+
+    def snapshot(self):
+        """Merged copy of all counters as a dict"""
+        counters = dict(zip(FIELDS, self._table.sum(axis=0).tolist()))
+        counters['current_load'] = max(0, min(100, counters['current_load']))
+        return counters
+
+def bump_load(shard, delta, low=0, high=100):
+    """Per-request load change, clamped within the shard's own contribution"""
+    shard.current_load = max(low, min(high, shard.current_load + delta))
@@ -0,0 +1,105 @@
+# predictors.py - Incremental O(1) predictors for per-server metric streams
+from collections import deque
+
+PREDICT_WINDOW = 5
+SMOOTHING_ALPHA = 0.3
+REGRESSION_WEIGHT = 0.6  # hybrid = 60% trend + 40% smoothing
+RESYNC_EVERY = 1024      # recompute running sums now and then to stop float drift
+
+class EWMA:
+    """Running exponentially weighted moving average"""
+    def __init__(self, alpha=SMOOTHING_ALPHA):
+        self.alpha = alpha
+        self.value = None
+
+    def update(self, x):
+        if self.value is None:
+            self.value = float(x)
+        else:
+            self.value = self.alpha * x + (1 - self.alpha) * self.value
+        return self.value
+
+    def predict(self):
+        return self.value
+
+class SlidingLinearTrend:
+    """
+    Least-squares line over the last `window` samples, extrapolated one step.
+    x runs 0..n-1 inside the window, so sliding by one sample only shifts
+    the running sums: every update is O(1) and the numbers stay small.
+    """
+    def __init__(self, window=PREDICT_WINDOW):
+        self.window = window
+        self.values = deque(maxlen=window)
+        self.sum_y = 0.0
+        self.sum_xy = 0.0
+        self._updates = 0
+
+    def update(self, y):
+        y = float(y)
+        if len(self.values) == self.window:
+            # Drop x=0, shift every remaining x down by one
+            self.sum_y -= self.values.popleft()
+            self.sum_xy -= self.sum_y
+        self.sum_xy += len(self.values) * y  # new sample sits at x = len
+        self.sum_y += y
+        self.values.append(y)
+
+        self._updates += 1
+        if self._updates % RESYNC_EVERY == 0:
+            self.sum_y = sum(self.values)
+            self.sum_xy = sum(i * v for i, v in enumerate(self.values))
+
+    def predict(self):
+        n = len(self.values)
+        if n == 0:
+            return None
+        if n == 1:
+            return self.values[-1]
+        # Closed-form sums of x and x^2 for x = 0..n-1
+        sum_x = n * (n - 1) / 2.0
+        sum_xx = (n - 1) * n * (2 * n - 1) / 6.0
+        slope = (n * self.sum_xy - sum_x * self.sum_y) / (n * sum_xx - sum_x * sum_x)
+        intercept = (self.sum_y - slope * sum_x) / n
+        return intercept + slope * n
+
+class HybridPredictor:
+    """Blend of the sliding trend and the EWMA (the client's hybrid prediction)"""
+    def __init__(self, window=PREDICT_WINDOW, alpha=SMOOTHING_ALPHA, weight=REGRESSION_WEIGHT):
+        self.trend = SlidingLinearTrend(window)
+        self.smooth = EWMA(alpha)
+        self.weight = weight
+
+    def update(self, y):
+        self.trend.update(y)
+        self.smooth.update(y)
+
+    def predict(self):
+        regress = self.trend.predict()
+        smooth = self.smooth.predict()
+        if smooth is None or regress is None:
+            return smooth or regress
+        return self.weight * regress + (1 - self.weight) * smooth
+
+class RollingMean:
+    """Mean of the last `window` samples via a running sum"""
+    def __init__(self, window):
+        self.values = deque(maxlen=window)
+        self.total = 0.0
+        self._updates = 0
+
+    def update(self, y):
+        y = float(y)
+        if len(self.values) == self.values.maxlen:
+            self.total -= self.values.popleft()
+        self.values.append(y)
+        self.total += y
+
+        self._updates += 1
+        if self._updates % RESYNC_EVERY == 0:
+            self.total = sum(self.values)
+
+    def predict(self):
+        if not self.values:
+            return None
+        return self.total / len(self.values)
@@ -0,0 +1,285 @@
+# probe.py - Concurrent probe engine shared by client.py and app.py
+import asyncio
+import socket
+import time
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from profiling import span, profiled
+
+HOST = '127.0.0.1'
+SOCKET_TIMEOUT = 0.6
+ROUND_DEADLINE = 1.0      # whole-round budget in seconds
+MAX_PROBE_WORKERS = 256   # upper bound on probe threads
+MAX_IDLE_PER_PORT = 4     # idle keep-alive connections kept per server
+MAX_IDLE_PER_BACKEND = 64 # idle asyncio connections kept per server by BackendPool
+STREAM_CHUNK = 64 * 1024  # receive buffer size for streamed object bodies
+
+_executor = None
+_pools = {}
+_pools_lock = threading.Lock()
+
+def _get_executor():
+    """Lazily create the shared probe thread pool"""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=MAX_PROBE_WORKERS,
+                                       thread_name_prefix="probe")
+    return _executor
+
+class Connection:
+    """One keep-alive connection speaking the newline-delimited probe protocol"""
+    def __init__(self, host, port, timeout):
+        self.sock = socket.create_connection((host, port), timeout=timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.rfile = self.sock.makefile('rb')
+
+    def request(self, command, timeout):
+        """Send one command line and return the decoded JSON reply line."""
+        self.sock.settimeout(timeout)
+        with span('probe.send'):
+            self.sock.sendall(command + b"\n")
+        with span('probe.wait'):  # server-side work (and its simulated delay) plus transfer
+            line = self.rfile.readline()
+        if not line:
+            raise ConnectionError("server closed the connection")
+        with span('probe.decode'):
+            return json.loads(line)
+
+    def fetch(self, key, timeout, byte_range=None):
+        """`get` one object, or `byte_range` of it; returns (header dict, body bytes)."""
+        header = self._get(key, timeout, byte_range)
+        body = self.rfile.read(header['length'])
+        if len(body) != header['length']:
+            raise ConnectionError("connection closed mid-body")
+        return header, body
+
+    def fetch_into(self, key, buffer, timeout, byte_range=None):
+        """
+        `get` into a preallocated writable buffer; returns the header, whose
+        `length` says how much of `buffer` was filled. Raises ValueError if
+        the body does not fit (the connection is then unusable).
+        """
+        header = self._get(key, timeout, byte_range)
+        if header['length'] > len(buffer):
+            raise ValueError(f"{header['length']}-byte body does not fit a {len(buffer)}-byte buffer")
+        self._read_into(memoryview(buffer)[:header['length']])
+        return header
+
+    def stream(self, key, sink, timeout, byte_range=None, buffer=None):
+        """
+        `get` an object of any size with flat memory: the body is received
+        into one reusable buffer (STREAM_CHUNK bytes unless given) and handed
+        to `sink(memoryview)` piece by piece. Returns the header.
+        """
+        header = self._get(key, timeout, byte_range)
+        view = memoryview(buffer if buffer is not None else bytearray(STREAM_CHUNK))
+        remaining = header['length']
+        while remaining:
+            n = self.rfile.readinto(view[:min(len(view), remaining)])
+            if not n:
+                raise ConnectionError("connection closed mid-body")
+            sink(view[:n])
+            remaining -= n
+        return header
+
+    def _get(self, key, timeout, byte_range):
+        """Send one `get` and return its parsed header line"""
+        self.sock.settimeout(timeout)
+        command = b"get " + key
+        if byte_range is not None:
+            first, last = byte_range
+            command += b" %s-%s" % (b"" if first is None else b"%d" % first,
+                                    b"" if last is None else b"%d" % last)
+        self.sock.sendall(command + b"\n")
+        line = self.rfile.readline()
+        if not line:
+            raise ConnectionError("server closed the connection")
+        header = json.loads(line)
+        if 'error' in header:
+            raise ValueError(header['error'])
+        return header
+
+    def _read_into(self, view):
+        """Fill `view` from the socket (readinto goes straight to recv_into for big reads)"""
+        while view:
+            n = self.rfile.readinto(view)
+            if not n:
+                raise ConnectionError("connection closed mid-body")
+            view = view[n:]
+
+    def closed_by_peer(self):
+        """
+        True if an idle connection is readable: with no request pending that
+        means the server closed it (e.g. it restarted) or broke the protocol.
+        """
+        self.sock.setblocking(False)  # every request sets its own timeout again
+        try:
+            self.sock.recv(1, socket.MSG_PEEK)
+        except BlockingIOError:
+            return False
+        except OSError:
+            return True
+        return True  # EOF, or bytes nobody asked for
+
+    def close(self):
+        try:
+            self.rfile.close()
+        finally:
+            self.sock.close()
+
+class ConnectionPool:
+    """Idle keep-alive connections to the servers on one host, keyed by port"""
+    def __init__(self, host=HOST, max_idle=MAX_IDLE_PER_PORT):
+        self.host = host
+        self.max_idle = max_idle
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, port, timeout=SOCKET_TIMEOUT):
+        with self._lock:
+            conns = self._idle.get(port) or []
+            while conns:
+                conn = conns.pop()
+                if not conn.closed_by_peer():
+                    return conn
+                conn.close()  # the server went away while it sat idle (e.g. restarted)
+        with span('probe.connect'):
+            return Connection(self.host, port, timeout)
+
+    def release(self, port, conn):
+        """Return a healthy connection (no reply pending) to the pool."""
+        with self._lock:
+            conns = self._idle.setdefault(port, [])
+            if len(conns) < self.max_idle:
+                conns.append(conn)
+                return
+        conn.close()
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for conns in idle.values():
+            for conn in conns:
+                conn.close()
+
+class BackendPool:
+    """
+    asyncio counterpart of ConnectionPool for one server: idle keep-alive
+    (reader, writer) pairs reused across requests (proxy backends, edge parents)
+    """
+    def __init__(self, host, port, max_idle=MAX_IDLE_PER_BACKEND):
+        self.host = host
+        self.port = port
+        self.max_idle = max_idle
+        self._idle = []
+
+    async def acquire(self):
+        while self._idle:
+            reader, writer = self._idle.pop()
+            if not writer.is_closing() and not reader.at_eof():
+                return reader, writer
+            writer.close()
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        writer.get_extra_info('socket').setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return reader, writer
+
+    def release(self, conn):
+        """Return a connection with no reply pending"""
+        if len(self._idle) < self.max_idle:
+            self._idle.append(conn)
+        else:
+            conn[1].close()
+
+    def discard(self, conn):
+        conn[1].close()
+
+    def close_all(self):
+        idle, self._idle = self._idle, []
+        for _, writer in idle:
+            writer.close()
+
+def get_pool(host=HOST):
+    """Shared connection pool for `host`"""
+    with _pools_lock:
+        pool = _pools.get(host)
+        if pool is None:
+            pool = _pools[host] = ConnectionPool(host)
+        return pool
+
+@profiled('probe.ping_once')
+def ping_once(port, host=HOST, timeout=SOCKET_TIMEOUT):
+    """
+    Sends a ping over a pooled keep-alive connection and returns the metrics
+    dict. Raises on failure. RTT covers the request/reply exchange only, so
+    the TCP handshake of a fresh connection is not counted.
+    """
+    pool = get_pool(host)
+    conn = pool.acquire(port, timeout)
+    try:
+        start = time.perf_counter()
+        metrics = conn.request(b"ping", timeout)
+        end = time.perf_counter()
+    except Exception:
+        # The connection may have a reply in flight; never reuse it
+        conn.close()
+        raise
+    pool.release(port, conn)
+
+    metrics['rtt'] = end - start
+    return metrics
+
+def fetch(port, key, host=HOST, timeout=SOCKET_TIMEOUT, byte_range=None):
+    """
+    Fetch one object (`key` as bytes) over a pooled connection; `byte_range`
+    is (first, last) inclusive, (first, None) to the end, or (None, n) for
+    the last n bytes. Returns (header, body); header['cache'] says HIT or
+    MISS. Raises on failure.
+    """
+    pool = get_pool(host)
+    conn = pool.acquire(port, timeout)
+    try:
+        header, body = conn.fetch(key, timeout, byte_range)
+    except Exception:
+        conn.close()
+        raise
+    pool.release(port, conn)
+    return header, body
+
+def stream(port, key, sink, host=HOST, timeout=SOCKET_TIMEOUT, byte_range=None, buffer=None):
+    """Like fetch(), but hands the body to `sink` chunk by chunk (see Connection.stream)"""
+    pool = get_pool(host)
+    conn = pool.acquire(port, timeout)
+    try:
+        header = conn.stream(key, sink, timeout, byte_range, buffer)
+    except Exception:
+        conn.close()
+        raise
+    pool.release(port, conn)
+    return header
+
+def probe_all(ports, host=HOST, timeout=SOCKET_TIMEOUT, deadline=ROUND_DEADLINE, on_error=None):
+    """
+    Probe every port concurrently.
+    Returns {port: metrics or None}. The call returns after `deadline` seconds
+    at most, so round time is bounded by the slowest probe, not the sum.
+    """
+    futures = {_get_executor().submit(ping_once, p, host, timeout): p for p in ports}
+    done, not_done = wait(futures, timeout=deadline)
+
+    results = {}
+    for fut, p in futures.items():
+        if fut in not_done:
+            fut.cancel()
+            results[p] = None
+            if on_error:
+                on_error(p, TimeoutError(f"no reply within round deadline ({deadline}s)"))
+            continue
+        exc = fut.exception()
+        if exc is not None:
+            results[p] = None
+            if on_error:
+                on_error(p, exc)
+        else:
+            results[p] = fut.result()
+    return results
@@ -0,0 +1,160 @@
+# profiling.py - Opt-in per-stage timing spans kept in log-bucket histograms
+import functools
+import json
+import threading
+import time
+from contextlib import nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SUB_BITS = 2       # 4 buckets per power of two: each bucket spans at most ~19%
+BUCKETS = 64 << SUB_BITS
+METRICS_PATH = "/metrics"
+
+enabled = False
+spans = {}  # stage name -> Histogram
+_spans_lock = threading.Lock()
+_NULL = nullcontext()
+
+def _bucket(ns):
+    """Bucket of a duration: its power of two, refined by the next SUB_BITS bits"""
+    bits = ns.bit_length()
+    if bits <= SUB_BITS:
+        return ns
+    return (bits - SUB_BITS) << SUB_BITS | (ns >> (bits - SUB_BITS - 1)) & ((1 << SUB_BITS) - 1)
+
+def _lower(bucket):
+    """Smallest duration (ns) that lands in `bucket`"""
+    if bucket < 1 << SUB_BITS:
+        return bucket
+    shift = (bucket >> SUB_BITS) - 1
+    return ((1 << SUB_BITS) | bucket & ((1 << SUB_BITS) - 1)) << shift
+
+class Histogram:
+    """
+    Durations in nanoseconds, counted into fixed log-spaced buckets: O(1)
+    memory and an integer bit_length() per sample. Quantiles are the
+    midpoint of their bucket, so they are within ~10% of the truth.
+    """
+    def __init__(self):
+        self.counts = [0] * BUCKETS
+        self.count = 0
+        self.total = 0
+        self.max = 0
+        self._lock = threading.Lock()  # probes record from many threads
+
+    def record(self, ns):
+        b = _bucket(ns)
+        with self._lock:
+            self.counts[b] += 1
+            self.count += 1
+            self.total += ns
+            if ns > self.max:
+                self.max = ns
+
+    def quantile(self, q):
+        if not self.count:
+            return 0
+        rank = q * (self.count - 1)
+        seen = 0
+        for b, n in enumerate(self.counts):
+            seen += n
+            if seen > rank:
+                return min(self.max, (_lower(b) + _lower(b + 1)) // 2)
+        return self.max
+
+    def summary(self):
+        """Plain dict of the histogram's stats, in microseconds"""
+        return {
+            'count': self.count,
+            'total_ms': self.total / 1e6,
+            'mean_us': self.total / self.count / 1e3 if self.count else 0.0,
+            'p50_us': self.quantile(0.5) / 1e3,
+            'p99_us': self.quantile(0.99) / 1e3,
+            'max_us': self.max / 1e3,
+        }
+
+def histogram(name):
+    hist = spans.get(name)
+    if hist is None:
+        with _spans_lock:
+            hist = spans.setdefault(name, Histogram())
+    return hist
+
+class _Span:
+    __slots__ = ('hist', 'start')
+
+    def __init__(self, hist):
+        self.hist = hist
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        self.hist.record(time.perf_counter_ns() - self.start)
+        return False
+
+def span(name):
+    """Context manager timing one stage; a shared no-op while profiling is off"""
+    if not enabled:
+        return _NULL
+    return _Span(histogram(name))
+
+def profiled(name):
+    """Decorator timing every call of a function as stage `name`"""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return fn(*args, **kwargs)
+            start = time.perf_counter_ns()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                histogram(name).record(time.perf_counter_ns() - start)
+        return wrapper
+    return decorate
+
+def enable(on=True):
+    global enabled
+    enabled = on
+
+def reset():
+    with _spans_lock:
+        spans.clear()
+
+def snapshot():
+    """{stage: summary dict} for every stage recorded so far"""
+    return {name: hist.summary() for name, hist in sorted(spans.items())}
+
+def report():
+    """Per-stage timing table for the console"""
+    lines = [f"{'Stage':<22} {'Calls':>7} {'Total ms':>10} {'Mean µs':>10} {'p50 µs':>10} "
+             f"{'p99 µs':>10} {'Max µs':>10}",
+             "-" * 85]
+    for name, s in snapshot().items():
+        lines.append(f"{name:<22} {s['count']:>7} {s['total_ms']:>10.1f} {s['mean_us']:>10.1f} "
+                     f"{s['p50_us']:>10.1f} {s['p99_us']:>10.1f} {s['max_us']:>10.1f}")
+    return "\n".join(lines)
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path != METRICS_PATH:
+            self.send_error(404)
+            return
+        body = json.dumps(snapshot()).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # keep the console for the round tables
+
+def serve_metrics(port, host='127.0.0.1'):
+    """Serve snapshot() as JSON at http://host:port/metrics from a daemon thread; returns the server"""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="profile-metrics", daemon=True).start()
+    return server
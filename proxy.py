@@ -0,0 +1,249 @@
+# proxy.py - Load-balancing proxy that forwards requests to the best-scored edge
+import argparse
+import asyncio
+import json
+import itertools
+import math
+import sys
+from control_plane import ControlPlane, AdaptiveSchedule, PROBE_INTERVAL
+from probe import BackendPool
+from selection import BoundedLoadHash, ContentRing, power_of_two
+
+HOST = '127.0.0.1'
+PROXY_PORT = 8000
+BACKENDS = [8001, 8002, 8003]
+BACKEND_TIMEOUT = 2.0       # seconds to wait for an edge reply
+MAX_ATTEMPTS = 2            # backends tried per request before giving up
+RELAY_CHUNK = 64 * 1024     # object bodies are relayed at most this much at a time
+STRATEGIES = ('p2c', 'argmin', 'hash', 'shard')  # per-request backend selection
+LISTEN_BACKLOG = 4096
+RING_DOWN_ROUNDS = 3        # table versions an edge must stay unreachable before 'shard' moves its keys
+
+NO_BACKEND_REPLY = b'{"error": "no backend available"}\n'
+
+# ==================== PROXY STATE ====================
+control = None  # ControlPlane publishing the backend ranking
+pools = {}
+stats = {'requests': 0, 'failed': 0, 'retries': 0, 'forwarded': {}, 'backend_errors': {}}
+strategy = STRATEGIES[0]
+ring = None  # BoundedLoadHash, for the 'hash' strategy
+content_ring = None  # ContentRing, for the 'shard' strategy
+_scores = (0, None)  # (table version, scores in control.servers order)
+_down_since = {}     # server index -> first table version it was seen unreachable
+_last_score = {}     # server index -> its last finite score, for the content ring
+
+def refresh_scores(table):
+    """
+    Scores in control.servers order for `table`, rebuilt (and the content
+    ring reweighted) once per table version
+    """
+    global _scores
+    if _scores[0] != table.version:
+        _scores = (table.version, [table.scores[p] for p in control.servers])
+        if content_ring is not None:
+            content_ring.reweight(_ring_scores(table.version, _scores[1]))
+    return _scores[1]
+
+def _ring_scores(version, scores):
+    """
+    Scores for the content ring. Edges drop pings under load, so one failed
+    probe would move an edge's keys away and back a round later. An edge
+    keeps its ring weight until it has been seen unreachable for
+    RING_DOWN_ROUNDS versions (counted from the first refresh that saw it
+    down); until then failover covers its requests.
+    """
+    ring_scores = []
+    for i, s in enumerate(scores):
+        if math.isfinite(s):
+            _down_since.pop(i, None)
+            _last_score[i] = s
+        elif version - _down_since.setdefault(i, version) < RING_DOWN_ROUNDS:
+            s = _last_score.get(i, s)
+        ring_scores.append(s)
+    return ring_scores
+
+def pick_backend(table, line):
+    """
+    The strategy's first choice for one request, as (index, leased): `leased`
+    is the ring slot to release when the request is done ('hash' only).
+    argmin returns no index and simply follows the table's ranking.
+    """
+    if strategy == 'argmin':
+        return None, None
+    scores = refresh_scores(table)
+    if strategy == 'shard':
+        # Objects go to their owner on the content ring; anything else is spread by p2c
+        command, _, rest = line.partition(b" ")
+        if command == b"get" and rest.strip():
+            return content_ring.lookup(rest.split()[0]), None
+        return power_of_two(scores), None
+    if strategy == 'hash':
+        # Hash the command and key only, so every range of an object lands on the same edge
+        i = ring.choose(b" ".join(line.split()[:2]), scores)
+        return i, i
+    return power_of_two(scores), None
+
+def attempt_order(first, order):
+    """The chosen backend first, then the rest in ranking order"""
+    if first is not None:
+        yield first
+    for port in order:
+        if port != first:
+            yield port
+
+async def forward(line, client):
+    """
+    Send one request line to the backend picked by `strategy` and write its
+    raw reply to `client`, failing over along the ranking. Bytes are relayed
+    as received: nothing is re-encoded, and only object headers are parsed
+    (for the length). Bodies are streamed through RELAY_CHUNK at a time.
+    """
+    # Current routing table snapshot: one attribute read, no lock
+    table = control.table
+    index, leased = pick_backend(table, line)
+    first = control.servers[index] if index is not None else None
+    try:
+        await _forward(line, itertools.islice(attempt_order(first, table.order), MAX_ATTEMPTS), client)
+    finally:
+        if leased is not None:
+            ring.release(leased)
+
+async def relay(reader, client, length):
+    """Copy `length` body bytes from an edge to the client, waiting for the client in between"""
+    while length:
+        chunk = await asyncio.wait_for(reader.read(min(RELAY_CHUNK, length)), BACKEND_TIMEOUT)
+        if not chunk:
+            raise asyncio.IncompleteReadError(b"", length)
+        client.write(chunk)
+        length -= len(chunk)
+        await client.drain()
+
+async def _forward(line, ports, client):
+    for attempt, port in enumerate(ports):
+        if attempt:
+            stats['retries'] += 1
+        pool = pools[port]
+        try:
+            conn = await pool.acquire()
+        except OSError:
+            stats['backend_errors'][port] += 1
+            continue
+        reader, writer = conn
+        try:
+            writer.write(line)
+            await writer.drain()
+            reply = await asyncio.wait_for(reader.readline(), BACKEND_TIMEOUT)
+            if not reply.endswith(b"\n"):
+                raise ConnectionError("no reply")
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError):
+            # Timed out, reset, or dropped by the edge: the connection is unusable
+            pool.discard(conn)
+            stats['backend_errors'][port] += 1
+            continue
+        # Object replies carry `length` body bytes after the header line
+        length = json.loads(reply)['length'] if line.startswith(b"get ") and reply.startswith(b'{"key"') else 0
+        client.write(reply)
+        try:
+            await relay(reader, client, length)
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError) as e:
+            # Part of the body is already out, so there is no failing over: drop the client too
+            pool.discard(conn)
+            stats['backend_errors'][port] += 1
+            raise ConnectionError(f"edge {port} failed mid-body") from e
+        except BaseException:
+            pool.discard(conn)  # the client went away with body bytes still unread
+            raise
+        pool.release(conn)
+        stats['forwarded'][port] += 1
+        return
+    stats['failed'] += 1
+    client.write(NO_BACKEND_REPLY)
+
+def proxy_stats():
+    table = control.table
+    extra = {}
+    if content_ring is not None:
+        refresh_scores(table)  # report the ring for this table, not the last one a request saw
+        extra = {'ring_weights': dict(zip(control.servers, content_ring.weights)),
+                 'ring_rebuilds': content_ring.rebuilds}
+    return dict(stats, strategy=strategy, version=table.version, order=table.order,
+                scores=table.scores, **extra)
+
+async def handle_client(reader, writer):
+    """Same newline-delimited keep-alive protocol as the edges, one reply per line"""
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            command = line.strip()
+            if not command:
+                continue
+            if command == b"stats":
+                # Answered by the proxy itself, never forwarded
+                writer.write(json.dumps(proxy_stats()).encode() + b"\n")
+            else:
+                stats['requests'] += 1
+                if not line.endswith(b"\n"):
+                    line += b"\n"
+                await forward(line, writer)
+            await writer.drain()
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+async def serve(host, port):
+    try:
+        server = await asyncio.start_server(handle_client, host, port,
+                                            backlog=LISTEN_BACKLOG, reuse_address=True)
+    except OSError as e:
+        print(f"Error binding to {host}:{port} -> {e}")
+        sys.exit(1)
+    print(f"[PROXY {port}] Forwarding {host}:{port} -> backends {control.servers} ({strategy})")
+
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        for pool in pools.values():
+            pool.close_all()
+
+def main():
+    global control, strategy, ring, content_ring
+    parser = argparse.ArgumentParser(description="Mini CDN load-balancing proxy")
+    parser.add_argument("--port", type=int, default=PROXY_PORT, help="port clients connect to")
+    parser.add_argument("--backends", type=int, nargs="+", default=BACKENDS, help="edge ports")
+    parser.add_argument("--interval", type=float, default=PROBE_INTERVAL,
+                        help="seconds between probe rounds")
+    parser.add_argument("--strategy", choices=STRATEGIES, default=STRATEGIES[0],
+                        help="p2c: power of two choices, argmin: always the best, "
+                             "hash: bounded-load consistent hashing of the request line, "
+                             "shard: each object to its owner on a score-weighted content ring")
+    args = parser.parse_args()
+
+    strategy = args.strategy
+    ring = BoundedLoadHash(len(args.backends))
+    if strategy == 'shard':
+        content_ring = ContentRing(len(args.backends))
+
+    for p in args.backends:
+        pools[p] = BackendPool(HOST, p)
+        stats['forwarded'][p] = 0
+        stats['backend_errors'][p] = 0
+
+    # Probing runs on its own thread; rank once before accepting traffic
+    control = ControlPlane(args.backends, HOST, interval=args.interval,
+                           schedule=AdaptiveSchedule(args.backends, args.interval))
+    control.start()
+    control.wait_for(0, timeout=2 * control.deadline)
+
+    try:
+        asyncio.run(serve(HOST, args.port))
+    except KeyboardInterrupt:
+        print("\n[PROXY] Shutting down")
+    finally:
+        control.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+# report.py - Running per-server session aggregates for reports
+import numpy as np
+from sketch import QuantileSketch
+
+REPORT_QUANTILES = (0.5, 0.95, 0.99)
+
+class SessionAggregates:
+    """
+    Whole-session count / sum / min / max of every metric for every server,
+    plus a QuantileSketch per (server, sketched metric), folded in as samples
+    arrive. Reading a summary costs O(servers x metrics) however long the
+    session ran, so the end-of-session report never rescans history.
+    `version` bumps on every sample, for memoizing anything built from it.
+    NaN samples are skipped per metric, as in HistoryRing.means().
+    """
+    def __init__(self, servers, metrics, sketched=('rtt',)):
+        self.servers = list(servers)
+        self.metrics = tuple(metrics)
+        self._server_index = {p: i for i, p in enumerate(self.servers)}
+        self._metric_index = {m: i for i, m in enumerate(self.metrics)}
+        shape = (len(self.servers), len(self.metrics))
+        self._count = np.zeros(shape, dtype=np.int64)
+        self._sum = np.zeros(shape)
+        self._min = np.full(shape, np.inf)
+        self._max = np.full(shape, -np.inf)
+        self.sketches = {(p, m): QuantileSketch() for p in self.servers for m in sketched}
+        self.version = 0
+
+    def add(self, port, values):
+        """Fold one sample for `port` in; `values` is in `metrics` order."""
+        i = self._server_index[port]
+        values = np.asarray(values, dtype=float)
+        present = ~np.isnan(values)
+        self._count[i] += present
+        self._sum[i] += np.where(present, values, 0.0)
+        self._min[i] = np.fmin(self._min[i], values)
+        self._max[i] = np.fmax(self._max[i], values)
+        for metric in self.metrics:
+            sketch = self.sketches.get((port, metric))
+            if sketch is not None:
+                sketch.add(float(values[self._metric_index[metric]]))
+        self.version += 1
+
+    def count(self, port):
+        """Samples recorded for `port` (its most-reported metric)."""
+        return int(self._count[self._server_index[port]].max())
+
+    def means(self):
+        """(servers x metrics) session means; NaN with no samples."""
+        return np.divide(self._sum, self._count, out=np.full(self._sum.shape, np.nan),
+                         where=self._count > 0)
+
+    def mean(self, port, metric):
+        i, j = self._server_index[port], self._metric_index[metric]
+        return self._sum[i, j] / self._count[i, j] if self._count[i, j] else np.nan
+
+    def extremes(self, port, metric):
+        """(min, max) seen for one metric, or (NaN, NaN)."""
+        i, j = self._server_index[port], self._metric_index[metric]
+        if not self._count[i, j]:
+            return np.nan, np.nan
+        return float(self._min[i, j]), float(self._max[i, j])
+
+    def quantiles(self, port, metric, qs=REPORT_QUANTILES):
+        """Sketch estimates of `qs` for a sketched metric (within the sketch's relative accuracy)."""
+        return self.sketches[(port, metric)].quantiles(qs)
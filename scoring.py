@@ -0,0 +1,85 @@
+# scoring.py - Vectorized fleet scoring (one NumPy pass for every server)
+from collections import namedtuple
+import numpy as np
+from profiling import profiled
+
+# Column order of the feature matrix passed to compute_scores
+FEATURES = ('rtt', 'load', 'health', 'error_rate', 'bandwidth', 'hit_ratio', 'rtt_p95')
+RTT, LOAD, HEALTH, ERROR_RATE, BANDWIDTH, HIT_RATIO, RTT_P95 = range(len(FEATURES))
+
+# (alpha, beta, gamma, delta, epsilon, zeta, eta), same defaults as client.compute_score
+DEFAULT_WEIGHTS = (1.0, 0.5, 0.3, 0.2, 0.4, 0.3, 0.5)
+
+MAX_BANDWIDTH = 1000.0  # Mbps used to normalise the bandwidth bonus
+
+Ranking = namedtuple('Ranking', ['scores', 'best', 'top'])
+
+def _all_features(matrix):
+    """Pad a matrix with fewer columns than FEATURES (older callers) with NaN"""
+    missing = len(FEATURES) - matrix.shape[1]
+    if missing > 0:
+        matrix = np.hstack((matrix, np.full((matrix.shape[0], missing), np.nan)))
+    return matrix
+
+def feature_matrix(rows):
+    """
+    Stack per-server feature tuples (None for missing) into an (N, 7) float
+    array. Tuples may stop early; trailing features are then unknown.
+    """
+    matrix = np.full((len(rows), len(FEATURES)), np.nan)
+    for i, row in enumerate(rows):
+        matrix[i, :len(row)] = [np.nan if v is None else v for v in row]
+    return matrix
+
+@profiled('compute_scores')
+def compute_scores(matrix, weights=DEFAULT_WEIGHTS, k=1):
+    """
+    Score the whole fleet at once. `matrix` is (N, 7) in FEATURES order, NaN
+    where a value is unknown. Lower score is better; servers without an RTT
+    score inf, exactly like compute_score. Servers with no cache data pay no
+    miss penalty, and the tail term only charges how far p95 RTT sits above
+    the RTT, so servers with no tail data pay nothing for it either.
+    Shorter `weights` use the defaults for the rest.
+    Returns Ranking(scores, best, top) where `best` is the argmin index (None
+    if nobody is reachable) and `top` the k best indices in ascending score.
+    """
+    matrix = _all_features(np.asarray(matrix, dtype=float))
+    weights = tuple(weights) + DEFAULT_WEIGHTS[len(weights):]
+    alpha, beta, gamma, delta, epsilon, zeta, eta = weights
+
+    rtt = matrix[:, RTT]
+    load = np.nan_to_num(matrix[:, LOAD], nan=100.0)
+    health_penalty = (100.0 - matrix[:, HEALTH]) / 100.0
+    health_penalty = np.where(np.isnan(health_penalty), 1.0, health_penalty)
+    error_rate = np.nan_to_num(matrix[:, ERROR_RATE], nan=0.0)
+    bandwidth = matrix[:, BANDWIDTH]
+    with np.errstate(invalid='ignore'):
+        bandwidth_factor = np.where(bandwidth > 0, (MAX_BANDWIDTH - bandwidth) / MAX_BANDWIDTH, 0.0)
+    miss_ratio = np.nan_to_num(1.0 - matrix[:, HIT_RATIO], nan=0.0)
+    tail_excess = np.nan_to_num(np.maximum(matrix[:, RTT_P95] - rtt, 0.0), nan=0.0)
+
+    scores = (alpha * rtt +
+              beta * (load / 100.0) +
+              gamma * health_penalty +
+              delta * error_rate +
+              epsilon * bandwidth_factor +
+              zeta * miss_ratio +
+              eta * tail_excess)
+    scores = np.where(np.isnan(rtt), np.inf, scores)
+
+    best, top = rank(scores, k)
+    return Ranking(scores, best, top)
+
+def rank(scores, k=1):
+    """argmin and the k lowest-score indices (sorted), in O(N) for small k."""
+    n = len(scores)
+    if n == 0 or not np.isfinite(scores).any():
+        return None, np.array([], dtype=int)
+    k = max(1, min(k, n))
+    if k < n:
+        top = np.argpartition(scores, k - 1)[:k]
+    else:
+        top = np.arange(n)
+    top = top[np.argsort(scores[top], kind='stable')]
+    top = top[np.isfinite(scores[top])]
+    return int(top[0]), top
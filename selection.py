@@ -0,0 +1,155 @@
+# selection.py - Pluggable server selection strategies over fleet scores
+import bisect
+import hashlib
+import math
+import random
+import numpy as np
+
+VIRTUAL_NODES = 100  # ring points per server for consistent hashing
+LOAD_FACTOR = 1.25   # bounded loads: no server takes more than c x the average
+WEIGHT_LEVELS = 4    # content ring weights are quantized so score jitter moves no content
+
+# Every strategy takes a score array (lower is better, inf = unreachable,
+# as returned by scoring.compute_scores) and returns an index into it, or
+# None if nothing is reachable.
+
+def argmin(scores):
+    """Lowest score. O(N), and every caller herds onto the same server."""
+    scores = np.asarray(scores, dtype=float)
+    if len(scores) == 0:
+        return None
+    i = int(np.argmin(scores))
+    return i if np.isfinite(scores[i]) else None
+
+def epsilon_greedy(scores, epsilon, prev=None, anti_stick=0.0):
+    """
+    argmin with probability 1-ε, otherwise a random server weighted by
+    1/score. `anti_stick` is added to the previous pick's score first.
+    """
+    adj = np.array(scores, dtype=float)
+    if prev is not None:
+        adj[prev] += anti_stick
+    live = np.isfinite(adj)
+    if not live.any():
+        return None
+    if random.random() < epsilon:
+        inv = np.where(live, 1.0 / np.clip(adj, 1e-6, None), 0.0)
+        return int(np.random.choice(len(adj), p=inv / inv.sum()))
+    return argmin(adj)
+
+def power_of_two(scores):
+    """
+    Power of two random choices: sample two servers, keep the better one.
+    O(1) per decision, and stale scores spread load instead of herding it.
+    """
+    n = len(scores)
+    if n == 0:
+        return None
+    if n == 1:
+        return 0 if math.isfinite(scores[0]) else None
+    a = random.randrange(n)
+    b = random.randrange(n - 1)
+    if b >= a:
+        b += 1  # two distinct servers
+    pick = a if scores[a] <= scores[b] else b
+    if not math.isfinite(scores[pick]):
+        return argmin(scores)  # both unreachable: rare O(N) fallback
+    return pick
+
+def _ring_hash(key):
+    if isinstance(key, str):
+        key = key.encode()
+    return int.from_bytes(hashlib.md5(key).digest()[:8], 'big')
+
+class BoundedLoadHash:
+    """
+    Consistent hashing with bounded loads: a key maps to the first server
+    clockwise on the ring that is reachable and below ceil(c * average)
+    in-flight requests, so the same content sticks to the same edge
+    (cache affinity) until that edge is overloaded. Call release(index)
+    when a request chosen by choose() completes.
+    """
+    def __init__(self, n, vnodes=VIRTUAL_NODES, c=LOAD_FACTOR):
+        self.n = n
+        self.c = c
+        points = sorted((_ring_hash(f"{i}-{v}"), i) for i in range(n) for v in range(vnodes))
+        self._hashes = [h for h, _ in points]
+        self._owners = [i for _, i in points]
+        self.load = [0] * n
+        self.total = 0
+
+    def choose(self, key, scores=None):
+        live = self.n if scores is None else sum(1 for s in scores if math.isfinite(s))
+        if live == 0:
+            return None
+        cap = math.ceil(self.c * (self.total + 1) / live)
+        pos = bisect.bisect(self._hashes, _ring_hash(key))
+        tried = set()
+        for step in range(len(self._owners)):
+            i = self._owners[(pos + step) % len(self._owners)]
+            if i in tried:
+                continue
+            tried.add(i)
+            if (scores is None or math.isfinite(scores[i])) and self.load[i] < cap:
+                self.load[i] += 1
+                self.total += 1
+                return i
+            if len(tried) == self.n:
+                break
+        return None
+
+    def release(self, index):
+        self.load[index] -= 1
+        self.total -= 1
+
+class ContentRing:
+    """
+    Weighted consistent-hash ring for content sharding: every key has one
+    owning edge, so each edge caches its own slice of the catalogue and the
+    fleet's cache capacity adds up instead of every edge holding the same
+    hot set. Server i gets vnodes * level_i / levels ring points, where
+    level_i is its score relative to the best one (best / score) rounded up
+    to one of `levels` steps; unreachable servers get none. Point v of a
+    server always hashes to the same place, so a weight change only adds or
+    removes that server's last points and an edge going down only moves the
+    keys it owned: everything else stays where it is cached.
+    """
+    def __init__(self, n, vnodes=VIRTUAL_NODES, levels=WEIGHT_LEVELS):
+        self.n = n
+        self.vnodes = vnodes
+        self.levels = levels
+        self._points = [[_ring_hash(f"{i}-{v}") for v in range(vnodes)] for i in range(n)]
+        self.weights = None
+        self.rebuilds = 0
+        self.reweight([0.0] * n)
+
+    def weights_for(self, scores):
+        """Quantized weight (0..levels) of each server for these scores"""
+        live = [s for s in scores if math.isfinite(s)]
+        if not live:
+            return [0] * self.n
+        best = min(live)
+        return [0 if not math.isfinite(s) else
+                self.levels if s <= 0 or best <= 0 else
+                max(1, math.ceil(self.levels * best / s - 1e-9))
+                for s in scores]
+
+    def reweight(self, scores):
+        """Rebuild the ring if the quantized weights changed; returns True if it did"""
+        weights = self.weights_for(scores)
+        if weights == self.weights:
+            return False
+        self.weights = weights
+        points = sorted((h, i) for i, w in enumerate(weights)
+                        for h in self._points[i][:self.vnodes * w // self.levels])
+        self._hashes = [h for h, _ in points]
+        self._owners = [i for _, i in points]
+        self.rebuilds += 1
+        return True
+
+    def lookup(self, key):
+        """Index of the server owning `key`, or None if no server is reachable"""
+        if not self._owners:
+            return None
+        pos = bisect.bisect(self._hashes, _ring_hash(key))
+        return self._owners[pos % len(self._owners)]
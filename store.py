@@ -0,0 +1,273 @@
+# store.py - On-disk object store: memory-mapped slab files plus a persisted index
+import asyncio
+import mmap
+import os
+import struct
+import time
+import zlib
+from collections import namedtuple
+import numpy as np
+
+STORE_BYTES = 1024 * 1024 * 1024  # default disk budget per store
+SLAB_SIZE = 64 * 1024 * 1024      # bigger objects get a slab of their own
+INDEX_FILE = "index.bin"
+SEND_CHUNK = 64 * 1024            # copy size when sendfile is unavailable
+
+# Slab record: header, key, body. A zero key length marks the unwritten tail
+# of a slab, since slabs are created as zero-filled sparse files.
+RECORD = struct.Struct('<HIdI')   # key_len, length, expires (time.time(), inf = never), crc32(body)
+
+# Index file = header, per-slab write positions, entries, then all keys back to back
+INDEX_MAGIC = b"MCDNIDX\x01"
+INDEX_HEADER = np.dtype([('magic', 'S8'), ('entries', '<u8'), ('slabs', '<u4'), ('reserved', '<u4')])
+SLAB_DTYPE = np.dtype([('slab', '<u4'), ('end', '<u8')])
+ENTRY_DTYPE = np.dtype([('slab', '<u4'), ('offset', '<u8'), ('length', '<u4'),
+                        ('expires', '<f8'), ('key_len', '<u2')])
+
+# Where one object's body lives; `file` is the slab's open file, for sendfile
+Entry = namedtuple('Entry', ['slab', 'offset', 'length', 'expires', 'file'])
+
+class Slab:
+    """One preallocated slab file, mapped into memory, filled front to back"""
+    def __init__(self, path, size=None):
+        self.path = path
+        self.file = open(path, 'r+b' if size is None else 'w+b')
+        if size is not None:
+            self.file.truncate(size)  # sparse: disk blocks are only used once written
+        self.size = os.fstat(self.file.fileno()).st_size
+        self.map = mmap.mmap(self.file.fileno(), self.size)
+        self.end = 0
+
+    def close(self, unlink=False):
+        self.map.flush()
+        self.map.close()
+        if unlink:
+            os.unlink(self.path)
+        # The file itself closes once no in-flight sendfile holds it any more
+        self.file = None
+
+class SlabStore:
+    """
+    Log-structured object store for an edge. Bodies are appended to
+    memory-mapped slab files and an in-memory index maps key -> location;
+    nothing about a body lives on the Python heap until read() is called,
+    and send() hands the file region straight to the kernel (sendfile).
+    When the store outgrows `capacity`, the oldest slab is dropped whole;
+    slabs are capped at a quarter of `capacity` so small budgets still evict.
+    close() persists the index; on reopen the index is loaded and any records
+    appended after it was saved (e.g. before a crash) are recovered by
+    scanning the slab tails, so a restart never starts cold.
+    TTLs use wall-clock time so they stay valid across restarts.
+    """
+    def __init__(self, directory, capacity=STORE_BYTES, ttl=None, stale_ttl=0, slab_size=SLAB_SIZE):
+        self.directory = directory
+        self.capacity = capacity
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.slab_size = max(1, min(slab_size, capacity // 4))
+        self._index = {}  # key -> (slab, offset, length, expires)
+        self._slabs = {}  # slab id -> Slab, oldest first
+        self.live_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.hit_bytes = 0
+        self.stale_hits = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.recovered = 0
+
+        os.makedirs(directory, exist_ok=True)
+        for name in sorted(os.listdir(directory)):
+            path = os.path.join(directory, name)
+            if name.endswith('.slab'):
+                if os.path.getsize(path) == 0:
+                    os.unlink(path)  # created but never sized before a crash
+                    continue
+                self._slabs[int(name[:-5])] = Slab(path)
+        self.loaded = 0
+        ends = self._load_index()
+        for slab_id, slab in self._slabs.items():
+            slab.end = self._scan(slab_id, ends.get(slab_id, 0))
+
+    def __len__(self):
+        return len(self._index)
+
+    def __contains__(self, key):
+        return key in self._index
+
+    @property
+    def disk_bytes(self):
+        return sum(slab.size for slab in self._slabs.values())
+
+    def lookup(self, key, now=None):
+        """(Entry, stale) for `key`, or (None, False); stale within stale_ttl past the TTL"""
+        item = self._index.get(key)
+        if item is None:
+            self.misses += 1
+            return None, False
+        slab_id, offset, length, expires = item
+        now = now if now is not None else time.time()
+        if now >= expires + self.stale_ttl:
+            self._drop(key)
+            self.expirations += 1
+            self.misses += 1
+            return None, False
+        stale = now >= expires
+        self.hits += 1
+        self.hit_bytes += length
+        if stale:
+            self.stale_hits += 1
+        return Entry(slab_id, offset, length, expires, self._slabs[slab_id].file), stale
+
+    def read(self, entry):
+        """Copy one body out of its slab mapping"""
+        return self._slabs[entry.slab].map[entry.offset:entry.offset + entry.length]
+
+    async def send(self, writer, entry, start=0, end=None):
+        """
+        Write body[start:end] of one entry to a stream: os.sendfile straight
+        from the slab file (zero-copy), or SEND_CHUNK-sized preads of it where
+        the transport cannot sendfile. Both go through entry.file, never the
+        slab mapping, so a send survives its slab being evicted mid-body.
+        asyncio's own fallback is not used: it seeks and reads the shared file
+        object, which concurrent sends would interleave.
+        """
+        end = entry.length if end is None else end
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.sendfile(writer.transport, entry.file, entry.offset + start, end - start,
+                                fallback=False)
+        except asyncio.SendfileNotAvailableError:
+            fd = entry.file.fileno()
+            for pos in range(entry.offset + start, entry.offset + end, SEND_CHUNK):
+                writer.write(os.pread(fd, min(entry.offset + end, pos + SEND_CHUNK) - pos, pos))
+                await writer.drain()
+
+    def put(self, key, value, ttl=None, now=None):
+        """Append `value` under `key`; returns False if it can never fit"""
+        size = RECORD.size + len(key) + len(value)
+        if size > self.capacity:
+            return False
+        ttl = self.ttl if ttl is None else ttl
+        expires = (now if now is not None else time.time()) + ttl if ttl else float('inf')
+
+        slab_id, slab = self._writable(size)
+        start = slab.end
+        offset = start + RECORD.size + len(key)
+        slab.map[start:start + RECORD.size] = RECORD.pack(len(key), len(value), expires, zlib.crc32(value))
+        slab.map[start + RECORD.size:offset] = key
+        slab.map[offset:offset + len(value)] = value
+        slab.end = offset + len(value)
+
+        self._drop(key)
+        self._index[key] = (slab_id, offset, len(value), expires)
+        self.live_bytes += len(value)
+        return True
+
+    def delete(self, key):
+        self._drop(key)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'items': len(self._index),
+            'bytes': self.live_bytes,
+            'disk_bytes': self.disk_bytes,
+            'capacity': self.capacity,
+            'slabs': len(self._slabs),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_bytes': self.hit_bytes,
+            'hit_ratio': self.hits / lookups if lookups else 0.0,
+            'stale_hits': self.stale_hits,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'loaded': self.loaded,
+            'recovered': self.recovered,
+        }
+
+    def close(self):
+        """Save the index and unmap every slab"""
+        self._save_index()
+        for slab in self._slabs.values():
+            slab.close()
+        self._slabs = {}
+
+    def _drop(self, key):
+        item = self._index.pop(key, None)
+        if item is not None:
+            self.live_bytes -= item[2]
+
+    def _writable(self, size):
+        """The slab the next `size`-byte record goes to, opening a new one if needed"""
+        if self._slabs:
+            slab_id = next(reversed(self._slabs))
+            slab = self._slabs[slab_id]
+            if slab.end + size <= slab.size:
+                return slab_id, slab
+            slab_id += 1
+        else:
+            slab_id = 0
+        slab = Slab(os.path.join(self.directory, f"{slab_id:08d}.slab"), max(self.slab_size, size))
+        self._slabs[slab_id] = slab
+        while self.disk_bytes > self.capacity and len(self._slabs) > 1:
+            self._evict_oldest()
+        return slab_id, slab
+
+    def _evict_oldest(self):
+        slab_id = next(iter(self._slabs))
+        for key in [k for k, item in self._index.items() if item[0] == slab_id]:
+            self._drop(key)
+        self._slabs.pop(slab_id).close(unlink=True)
+        self.evictions += 1
+
+    def _scan(self, slab_id, pos):
+        """Index the records in one slab from `pos` on; returns the slab's write position"""
+        slab = self._slabs[slab_id]
+        while pos + RECORD.size <= slab.size:
+            key_len, length, expires, crc = RECORD.unpack_from(slab.map, pos)
+            offset = pos + RECORD.size + key_len
+            end = offset + length
+            if key_len == 0 or end > slab.size or zlib.crc32(slab.map[offset:end]) != crc:
+                break  # unwritten tail, or a record torn by a crash
+            key = slab.map[pos + RECORD.size:offset]
+            self._drop(key)
+            self._index[key] = (slab_id, offset, length, expires)
+            self.live_bytes += length
+            self.recovered += 1
+            pos = end
+        return pos
+
+    def _load_index(self):
+        """Load the saved index into memory; returns {slab id: write position when saved}"""
+        path = os.path.join(self.directory, INDEX_FILE)
+        if not os.path.exists(path):
+            return {}
+        with open(path, 'rb') as f:
+            data = f.read()
+        header = np.frombuffer(data, INDEX_HEADER, count=1)[0]
+        if header['magic'] != INDEX_MAGIC:
+            return {}  # unknown format: rebuild everything from the slabs
+        pos = INDEX_HEADER.itemsize
+        ends = np.frombuffer(data, SLAB_DTYPE, count=int(header['slabs']), offset=pos)
+        pos += ends.nbytes
+        entries = np.frombuffer(data, ENTRY_DTYPE, count=int(header['entries']), offset=pos)
+        pos += entries.nbytes
+        key_ends = pos + np.cumsum(entries['key_len'], dtype=np.int64)
+        for entry, key_end in zip(entries.tolist(), key_ends.tolist()):
+            slab_id, offset, length, expires, key_len = entry
+            if slab_id in self._slabs:  # slabs evicted after the save are gone
+                self._index[data[key_end - key_len:key_end]] = (slab_id, offset, length, expires)
+                self.live_bytes += length
+                self.loaded += 1
+        return {int(s): int(end) for s, end in ends.tolist() if s in self._slabs}
+
+    def _save_index(self):
+        keys = list(self._index)
+        entries = np.array([self._index[k] + (len(k),) for k in keys], dtype=ENTRY_DTYPE)
+        ends = np.array([(s, slab.end) for s, slab in self._slabs.items()], dtype=SLAB_DTYPE)
+        header = np.array([(INDEX_MAGIC, len(entries), len(ends), 0)], dtype=INDEX_HEADER)
+        path = os.path.join(self.directory, INDEX_FILE)
+        with open(path + '.tmp', 'wb') as f:
+            f.write(header.tobytes() + ends.tobytes() + entries.tobytes() + b"".join(keys))
+        os.replace(path + '.tmp', path)  # a crash mid-save keeps the old index
@@ -0,0 +1,135 @@
+# telemetry.py - Append-only binary telemetry log for probe results
+import atexit
+import os
+import queue
+import sys
+import threading
+import time
+import numpy as np
+
+TELEMETRY_PATH = "telemetry.bin"
+FLUSH_INTERVAL = 1.0  # seconds between forced flushes to disk
+MAX_BATCH = 1024      # records written in one go before flushing early
+
+# File = 16-byte header, then fixed-size little-endian records back to back
+MAGIC = b"MCDNTEL\x01"
+RECORD_DTYPE = np.dtype([
+    ('ts', '<f8'),          # wall-clock time.time() of the probe round
+    ('rtt', '<f4'),         # seconds, NaN when the probe failed
+    ('load', '<f4'),
+    ('health', '<f4'),
+    ('errors', '<f4'),      # error rate, 0..1
+    ('bandwidth', '<f4'),   # Mbps
+    ('score', '<f4'),       # inf when unreachable
+    ('port', '<u2'),
+    ('chosen', 'u1'),
+])
+HEADER = np.dtype([('magic', 'S8'), ('record_size', '<u4'), ('reserved', '<u4')])
+HEADER_SIZE = HEADER.itemsize
+
+_CLOSE = object()
+
+def _nan(value):
+    return np.nan if value is None else value
+
+class TelemetryWriter:
+    """
+    Buffered append-only writer. record() only puts a tuple on a queue, so
+    it never blocks the probe loop on disk I/O; a background thread batches
+    records into RECORD_DTYPE arrays and appends them, flushing at least
+    every `flush_interval` seconds.
+    """
+    def __init__(self, path=TELEMETRY_PATH, flush_interval=FLUSH_INTERVAL, max_batch=MAX_BATCH):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.written = 0
+        self._queue = queue.SimpleQueue()
+
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            _check_header(path)
+        self._file = open(path, 'ab')
+        if self._file.tell() == 0:
+            header = np.array([(MAGIC, RECORD_DTYPE.itemsize, 0)], dtype=HEADER)
+            self._file.write(header.tobytes())
+            self._file.flush()
+
+        self._thread = threading.Thread(target=self._run, name="telemetry-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def record(self, port, ts, rtt, load, health, errors, bandwidth, score, chosen):
+        """Queue one probe result; missing values may be None."""
+        self._queue.put((ts, _nan(rtt), _nan(load), _nan(health), _nan(errors),
+                         _nan(bandwidth), _nan(score), port, 1 if chosen else 0))
+
+    def close(self):
+        """Flush everything queued so far and stop the writer thread."""
+        if self._thread.is_alive():
+            self._queue.put(_CLOSE)
+            self._thread.join()
+
+    def _run(self):
+        pending = []
+        next_flush = time.monotonic() + self.flush_interval
+        while True:
+            try:
+                item = self._queue.get(timeout=max(0.0, next_flush - time.monotonic()))
+            except queue.Empty:
+                item = None
+            if item is _CLOSE:
+                break
+            if item is not None:
+                pending.append(item)
+                if len(pending) < self.max_batch and time.monotonic() < next_flush:
+                    continue
+            self._write(pending)
+            pending = []
+            next_flush = time.monotonic() + self.flush_interval
+        self._write(pending)
+        self._file.close()
+
+    def _write(self, rows):
+        if rows:
+            self._file.write(np.array(rows, dtype=RECORD_DTYPE).tobytes())
+            self.written += len(rows)
+        self._file.flush()
+
+def _check_header(path):
+    header = np.fromfile(path, dtype=HEADER, count=1)
+    if len(header) != 1 or header['magic'][0] != MAGIC:
+        raise ValueError(f"{path} is not a telemetry log")
+    if header['record_size'][0] != RECORD_DTYPE.itemsize:
+        raise ValueError(f"{path} uses {header['record_size'][0]}-byte records, "
+                         f"expected {RECORD_DTYPE.itemsize}")
+
+def read_telemetry(path=TELEMETRY_PATH):
+    """
+    Memory-map a telemetry log for replay as a read-only structured array
+    (fields as in RECORD_DTYPE). A partially written trailing record is ignored.
+    """
+    _check_header(path)
+    count = (os.path.getsize(path) - HEADER_SIZE) // RECORD_DTYPE.itemsize
+    if count == 0:
+        return np.empty(0, dtype=RECORD_DTYPE)
+    return np.memmap(path, dtype=RECORD_DTYPE, mode='r', offset=HEADER_SIZE, shape=(count,))
+
+def summarize(path=TELEMETRY_PATH):
+    records = read_telemetry(path)
+    print(f"{path}: {len(records)} records")
+    if len(records) == 0:
+        return
+    span = records['ts'][-1] - records['ts'][0]
+    print(f"Span: {span:.1f}s")
+    print(f"{'Port':<8} {'Probes':<8} {'Failed':<8} {'RTT (ms)':<10} {'Load %':<8} {'Chosen':<8}")
+    for port in np.unique(records['port']):
+        rows = records[records['port'] == port]
+        rtt = rows['rtt']
+        failed = np.isnan(rtt)
+        mean_rtt = rtt[~failed].mean() * 1000 if (~failed).any() else np.nan
+        mean_load = np.nanmean(rows['load']) if (~failed).any() else np.nan
+        print(f"{port:<8} {len(rows):<8} {failed.sum():<8} {mean_rtt:<10.1f} "
+              f"{mean_load:<8.1f} {rows['chosen'].sum():<8}")
+
+if __name__ == "__main__":
+    summarize(sys.argv[1] if len(sys.argv) > 1 else TELEMETRY_PATH)
@@ -0,0 +1,23 @@
+# test_client.py - compute_score keeps its positional weight slots
+import math
+import pytest
+from client import compute_score
+
+FEATURES = (0.05, 40, 80, 0.01, 500.0)
+
+def test_weights_keep_their_positions():
+    weights = (2.0, 0.1, 0.7, 0.9, 0.2)
+    positional = compute_score(*FEATURES, *weights)
+    keywords = compute_score(*FEATURES, **dict(zip(('alpha', 'beta', 'gamma', 'delta', 'epsilon'), weights)))
+    assert positional == keywords
+    assert positional != compute_score(*FEATURES)
+
+def test_cache_and_tail_inputs_are_keyword_only():
+    base = compute_score(*FEATURES, 1.0, 0.5, 0.3, 0.2, 0.4)
+    assert compute_score(*FEATURES, 1.0, 0.5, 0.3, 0.2, 0.4, hit_ratio=0.2) > base
+    assert compute_score(*FEATURES, 1.0, 0.5, 0.3, 0.2, 0.4, rtt_p95=0.5) > base
+    with pytest.raises(TypeError):
+        compute_score(*FEATURES, 1.0, 0.5, 0.3, 0.2, 0.4, 0.9)
+
+def test_unreachable_server_scores_inf():
+    assert math.isinf(compute_score(None, 0, 0, 0, 0, 1.0, 0.5, 0.3, 0.2, 0.4))
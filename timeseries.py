@@ -0,0 +1,140 @@
+# timeseries.py - Bounded columnar time-series store for long monitoring sessions
+import numpy as np
+
+RAW_CAPACITY = 1200   # newest rows kept at full resolution
+BUCKET_SIZE = 60      # raw rows folded into one min/max/mean bucket
+MAX_BUCKETS = 1440    # downsampled history kept (retention = MAX_BUCKETS * BUCKET_SIZE rows)
+
+class SeriesStore:
+    """
+    One row per round, one float column per series (e.g. (port, 'rtt')).
+    The newest `raw_capacity` rows stay at full resolution in preallocated
+    arrays. When they fill up, the oldest `bucket_size` rows are folded into
+    a bucket holding min/max/sum/count per column, and only the newest
+    `max_buckets` buckets are retained, so memory is fixed up front no
+    matter how long the session runs. NaN marks a missing sample.
+    """
+    def __init__(self, columns, raw_capacity=RAW_CAPACITY, bucket_size=BUCKET_SIZE,
+                 max_buckets=MAX_BUCKETS):
+        self.columns = list(columns)
+        self._index = {c: i for i, c in enumerate(self.columns)}
+        self.raw_capacity = raw_capacity
+        self.bucket_size = min(bucket_size, raw_capacity)
+        self.max_buckets = max_buckets
+        self.appended = 0  # rows ever appended, including ones aged out
+
+        n = len(self.columns)
+        self._raw_t = np.empty(raw_capacity)
+        self._raw = np.empty((n, raw_capacity))
+        self._raw_len = 0
+
+        self._bucket_t = np.empty(max_buckets)
+        self._min = np.empty((n, max_buckets))
+        self._max = np.empty((n, max_buckets))
+        self._sum = np.empty((n, max_buckets))
+        self._count = np.empty((n, max_buckets))
+        self._bucket_len = 0
+
+    def __len__(self):
+        return self._bucket_len + self._raw_len
+
+    def append(self, t, values):
+        """Add one row; `values` maps column -> value (missing columns are NaN)."""
+        if self._raw_len == self.raw_capacity:
+            self._fold_oldest()
+        i = self._raw_len
+        self._raw_t[i] = t
+        row = self._raw[:, i]
+        row.fill(np.nan)
+        for column, value in values.items():
+            row[self._index[column]] = value
+        self._raw_len += 1
+        self.appended += 1
+
+    def _fold_oldest(self):
+        """Downsample the oldest bucket_size raw rows into one bucket."""
+        k = self.bucket_size
+        block = self._raw[:, :k]
+        if self._bucket_len == self.max_buckets:
+            # Retention: drop the oldest bucket
+            for arr in (self._bucket_t, self._min, self._max, self._sum, self._count):
+                arr[..., :-1] = arr[..., 1:]
+            self._bucket_len -= 1
+        b = self._bucket_len
+        self._bucket_t[b] = self._raw_t[:k].mean()
+        self._min[:, b] = np.fmin.reduce(block, axis=1)
+        self._max[:, b] = np.fmax.reduce(block, axis=1)
+        self._sum[:, b] = np.nansum(block, axis=1)
+        self._count[:, b] = np.count_nonzero(~np.isnan(block), axis=1)
+        self._bucket_len += 1
+
+        # Shift the remaining raw rows down
+        rest = self._raw_len - k
+        self._raw_t[:rest] = self._raw_t[k:self._raw_len]
+        self._raw[:, :rest] = self._raw[:, k:self._raw_len]
+        self._raw_len = rest
+
+    def times(self):
+        """Row timestamps, oldest first (bucket rows use their mean time)."""
+        return np.concatenate((self._bucket_t[:self._bucket_len], self._raw_t[:self._raw_len]))
+
+    def series(self, column, agg='mean'):
+        """Values of one column aligned with times(); `agg` picks the bucket statistic."""
+        c = self._index[column]
+        b = self._bucket_len
+        with np.errstate(invalid='ignore', divide='ignore'):
+            if agg == 'mean':
+                older = self._sum[c, :b] / self._count[c, :b]
+            elif agg == 'min':
+                older = self._min[c, :b]
+            elif agg == 'max':
+                older = self._max[c, :b]
+            elif agg == 'sum':
+                older = self._sum[c, :b]
+            else:
+                raise ValueError(f"unknown aggregate {agg!r}")
+        return np.concatenate((older, self._raw[c, :self._raw_len]))
+
+    def latest(self, column):
+        if self._raw_len == 0:
+            return np.nan
+        return float(self._raw[self._index[column], self._raw_len - 1])
+
+    def mean(self, column):
+        """Mean of every retained sample of a column (NaN-aware), exact across buckets."""
+        c = self._index[column]
+        raw = self._raw[c, :self._raw_len]
+        total = self._sum[c, :self._bucket_len].sum() + np.nansum(raw)
+        count = self._count[c, :self._bucket_len].sum() + np.count_nonzero(~np.isnan(raw))
+        return total / count if count else np.nan
+
+def lttb(x, y, threshold):
+    """
+    Largest-Triangle-Three-Buckets downsampling of (x, y) to `threshold`
+    points, keeping the first and last. Each bucket keeps the point forming
+    the largest triangle with the previous pick and the next bucket's mean,
+    so peaks and dips survive where plain decimation would drop them.
+    Series already within the budget are returned as is.
+    """
+    n = len(x)
+    if threshold is None or threshold < 3 or n <= threshold:
+        return x, y
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)  # threshold - 2 inner buckets
+    sizes = np.diff(edges)
+    # Mean of every bucket at once; the last inner bucket looks ahead to the final point
+    next_x = np.append((np.add.reduceat(x[1:n - 1], edges[:-1] - 1) / sizes)[1:], x[-1]).tolist()
+    next_y = np.append((np.add.reduceat(y[1:n - 1], edges[:-1] - 1) / sizes)[1:], y[-1]).tolist()
+    xs, ys, bounds = x.tolist(), y.tolist(), edges.tolist()
+    picks = [0]
+    ax, ay = xs[0], ys[0]
+    for i in range(threshold - 2):
+        nx, ny = next_x[i], next_y[i]
+        best, best_area = bounds[i], -1.0
+        for j in range(bounds[i], bounds[i + 1]):
+            area = abs((ax - nx) * (ys[j] - ay) - (ax - xs[j]) * (ny - ay))
+            if area > best_area:
+                best, best_area = j, area
+        picks.append(best)
+        ax, ay = xs[best], ys[best]
+    picks.append(n - 1)
+    return x[picks], y[picks]